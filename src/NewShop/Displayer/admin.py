@@ -1,13 +1,16 @@
 from django.contrib import admin
-from .models import News, Product, NspProduct, SpProduct, History, Favor, Price, Report, Alarm, HUser, WordCloudImg
+from .models import News, Product, NspProduct, SpProduct, History, Favor, Price, Report, Alarm, HUser, WordCloudImg, DailyPrice, Notification, NounCount
 # Register your models here.
 
 admin.site.register(News)
 admin.site.register(HUser)
 admin.site.register(Favor)
 admin.site.register(Price)
+admin.site.register(DailyPrice)
 admin.site.register(Report)
+admin.site.register(Notification)
 admin.site.register(Alarm)
 admin.site.register(WordCloudImg)
 admin.site.register(NspProduct)
-admin.site.register(SpProduct)
\ No newline at end of file
+admin.site.register(SpProduct)
+admin.site.register(NounCount)
@@ -0,0 +1,160 @@
+import bisect
+import datetime
+import collections
+from django.db.models import F, Q, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from Displayer.models import Alarm, Price, DailyPrice, Product, SpProduct, Notification
+
+# 가격 알림 판정을 SQL에서 처리함.
+# 알림 하나하나를 파이썬에서 비교하지 않고, 최신 가격과 상한/하한을 비교해 알림을 보내야 하는 것만 가져옴
+
+
+def latest_price(product_field='product_id'):
+    # 상품의 최신 가격. NspProduct는 DailyPrice의 최저가, SpProduct는 Price를 사용
+    daily = DailyPrice.objects.filter(product_id=OuterRef(product_field)).order_by('-date').values('value')[:1]
+    price = Price.objects.filter(product_id=OuterRef(product_field)).order_by('-date').values('value')[:1]
+    return Coalesce(Subquery(daily), Subquery(price))
+
+
+def crossed_price_alarms(product_ids=None):
+    """
+    alarms whose threshold was crossed by the latest price
+        reuse and lower > price     -> price dropped below the lower bound
+        not reuse and upper < price -> price went back above the upper bound (re-arm)
+    :param product_ids: only these products (default: every product)
+    :return: Alarm queryset annotated with price
+    """
+    alarms = Alarm.objects.annotate(price=latest_price())
+    if product_ids is not None:
+        alarms = alarms.filter(product_id__in=product_ids)
+    return alarms.filter(Q(reuse=True, lower__gt=F('price')) | Q(reuse=False, upper__lt=F('price'))) \
+        .select_related('user__user', 'product')
+
+
+def notify(huser, title, content, outbox=None):
+    """
+    :param outbox: list to collect the Notification rows in (saved by the caller with bulk_create)
+    """
+    if int(huser.alarmMethod/2)==1:
+        huser.sendSMS('[NewShop]\n'+content, outbox)
+    if huser.alarmMethod%2==1:
+        huser.sendEmail(title, content, outbox)
+
+
+def save_outbox(outbox):
+    Notification.objects.bulk_create(outbox, batch_size=1000)
+    del outbox[:]
+
+
+def price_message(alarm, price):
+    title = '[NewShop]가격 변동 알림 ('+alarm.product.name+')'
+    msg = alarm.user.user.username+'님, '+alarm.product.name+'의 가격이 '+str(price)+'이 되었으니 사이트에서 확인해 주세요.'
+    return title, msg
+
+
+def send_price_alarms(product_ids=None, batch_size=1000):
+    """
+    send every crossed price alarm and flip its reuse flag
+    :return: number of alarms sent
+    """
+    changed = []
+    outbox = []
+    sent = 0
+    for alarm in crossed_price_alarms(product_ids).iterator(chunk_size=batch_size):
+        alarm.reuse = not alarm.reuse
+        changed.append(alarm)
+        notify(alarm.user, *price_message(alarm, alarm.price), outbox=outbox)
+        sent += 1
+        if len(changed) >= batch_size:
+            Alarm.objects.bulk_update(changed, ['reuse'])
+            save_outbox(outbox)
+            changed = []
+    Alarm.objects.bulk_update(changed, ['reuse'])
+    save_outbox(outbox)
+    return sent
+
+
+# 아래는 새 Price/News가 저장된 직후 호출되는 이벤트 방식의 알림 처리.
+# 알림이 걸린 상품만 조회하고, 상품별로 정렬된 하한/상한에서 이진 탐색으로 넘은 알림을 찾음
+
+class AlarmIndex(object):
+    def __init__(self, alarms):
+        armed = sorted((a for a in alarms if a.reuse), key=lambda a: a.lower)
+        disarmed = sorted((a for a in alarms if not a.reuse), key=lambda a: a.upper)
+        self.armed = armed
+        self.lowers = [a.lower for a in armed]
+        self.disarmed = disarmed
+        self.uppers = [a.upper for a in disarmed]
+
+    def crossed(self, price):
+        # reuse인 알림 중 lower > price, reuse가 아닌 알림 중 upper < price
+        return self.armed[bisect.bisect_right(self.lowers, price):] + self.disarmed[:bisect.bisect_left(self.uppers, price)]
+
+
+def price_inserted(product_ids):
+    """
+    evaluate price alarms of products that just got a new Price
+    :param product_ids: SpProduct ids (their NspProduct is checked too)
+    :return: number of alarms sent
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return 0
+    product_ids |= set(SpProduct.objects.filter(id__in=product_ids).values_list('product_id', flat=True))
+    by_product = collections.defaultdict(list)
+    for alarm in Alarm.objects.filter(product_id__in=product_ids).select_related('user__user', 'product'):
+        by_product[alarm.product_id].append(alarm)
+    if not by_product:
+        return 0
+    prices = dict(Product.objects.filter(id__in=by_product.keys()).annotate(price=latest_price('id')).values_list('id', 'price'))
+    changed = []
+    outbox = []
+    for product_id, alarms in by_product.items():
+        price = prices.get(product_id)
+        if price is None:
+            continue
+        for alarm in AlarmIndex(alarms).crossed(price):
+            alarm.reuse = not alarm.reuse
+            changed.append(alarm)
+            notify(alarm.user, *price_message(alarm, price), outbox=outbox)
+    Alarm.objects.bulk_update(changed, ['reuse'], batch_size=1000)
+    save_outbox(outbox)
+    return len(changed)
+
+
+_news_notified = {}
+
+
+def news_inserted(news):
+    """
+    send news alarms for products that got today's news
+    :param news: News rows just written
+    :return: number of alarms sent
+    """
+    today = datetime.date.today()
+    if _news_notified.get('date') != today:
+        _news_notified.clear()
+        _news_notified['date'] = today
+        _news_notified['ids'] = set()
+    product_ids = set()
+    for n in news:
+        date = n.date.date() if isinstance(n.date, datetime.datetime) else n.date
+        if date == today:
+            product_ids.add(n.product_id)
+    # 뉴스 알림은 상품당 하루 한 번
+    product_ids -= _news_notified['ids']
+    if not product_ids:
+        return 0
+    _news_notified['ids'] |= product_ids
+    # NspProduct에 걸린 알림과, 그 하위 SpProduct에 걸린 알림 모두
+    alarms = Alarm.objects.filter(news_alarm=True).filter(
+        Q(product_id__in=product_ids) | Q(product__spproduct__product_id__in=product_ids)).select_related('user__user', 'product')
+    sent = 0
+    outbox = []
+    for a in alarms:
+        title = '[NewShop]뉴스 알림 ('+a.product.name+')'
+        msg = a.user.user.username+'님 안녕하세요. '+a.product.name+'과 관련한 새로운 소식이 있으니, 사이트에서 확인해 주시기 바랍니다.'
+        notify(a.user, title, msg, outbox)
+        sent += 1
+    save_outbox(outbox)
+    return sent
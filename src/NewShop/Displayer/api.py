@@ -0,0 +1,148 @@
+import json
+import calendar
+import datetime
+import collections
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.db.models import Q
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from Displayer.models import Product, NspProduct, Price, DailyPrice
+from Displayer.caching import product_version
+from Displayer.views import get_product
+
+# 외부 연동용 v2 API. 기존 API_json은 그대로 두고 날짜 범위, 페이지, HTTP 캐시를 지원함
+
+MAX_LIMIT = 10000
+MAX_PRODUCTS = 100
+
+
+def parse_date(value):
+    # 형식이 틀리면 ValueError (요청한 쪽에 400으로 돌려줌)
+    if not value:
+        return None
+    return datetime.date.fromisoformat(value)
+
+
+def parse_limit(value):
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return min(limit, MAX_LIMIT)
+
+
+def _concrete(request, keyword):
+    try:
+        return get_product(request, keyword).resolve()
+    except Product.DoesNotExist:
+        return None
+
+
+def price_validators(concrete):
+    """
+    :return: (latest price date or None, ETag, Last-Modified timestamp or None).
+        the latest date is read once; the response body is cut at that date so that it matches the validators
+    """
+    latest = concrete.getPrice().values_list('date', flat=True).first()
+    # 가격이 저장될 때마다 바뀌는 상품 버전과 최신 날짜로 만듦
+    etag = quote_etag('%d-%s-%s' % (concrete.id, product_version(concrete), latest))
+    last_modified = calendar.timegm(latest.timetuple()) if latest is not None else None
+    return latest, etag, last_modified
+
+
+def api_json_v2(request, keyword):
+    """
+    GET API/v2/json/<keyword>?from=YYYY-MM-DD&to=YYYY-MM-DD&limit=N&cursor=YYYY-MM-DD
+    prices in date order. when more rows remain, "next" is the cursor of the next page.
+    """
+    concrete = _concrete(request, keyword)
+    if concrete is None:
+        raise Http404
+    try:
+        limit = parse_limit(request.GET.get('limit', 1000))
+        start = parse_date(request.GET.get('from'))
+        end = parse_date(request.GET.get('to'))
+        cursor = parse_date(request.GET.get('cursor'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    latest, etag, last_modified = price_validators(concrete)
+    # If-None-Match / If-Modified-Since가 맞으면 304
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+    prices = concrete.getPrice().order_by('date')
+    prices = prices.filter(date__lte=latest) if latest is not None else prices.none()
+    if start:
+        prices = prices.filter(date__gte=start)
+    if end:
+        prices = prices.filter(date__lte=end)
+    if cursor:
+        # 상품 하나당 날짜별 가격은 하나이므로 날짜만으로 이어서 읽을 수 있음
+        prices = prices.filter(date__gt=cursor)
+    # 검사가 끝난 뒤에 늦게 읽지 않도록 여기서 다 읽어 둠 (최대 MAX_LIMIT+1행)
+    rows = list(prices.values_list('date', 'value')[:limit+1])
+
+    def stream():
+        yield '{"product": %s, "prices": [' % json.dumps(concrete.name, ensure_ascii=False)
+        last = None
+        for i, (date, value) in enumerate(rows):
+            if i == limit:
+                yield '], "next": "%s"}' % last
+                return
+            yield '%s{"date": "%s", "value": %d}' % (',' if i else '', date, value)
+            last = date
+        yield '], "next": null}'
+
+    response = StreamingHttpResponse(stream(), content_type='application/json; charset=utf-8')
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def api_prices(request):
+    """
+    GET API/v2/prices?name=A&name=B&id=3&from=YYYY-MM-DD&to=YYYY-MM-DD
+    price series of several products at once, in columnar form:
+        {"products": [{"id": 3, "name": "...", "dates": [...], "values": [...]}, ...]}
+    runs the same three queries however many products are asked (products, DailyPrice, Price)
+    """
+    names = request.GET.getlist('name')
+    try:
+        ids = [int(i) for i in request.GET.getlist('id')]
+        start = parse_date(request.GET.get('from'))
+        end = parse_date(request.GET.get('to'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if not names and not ids or len(names) + len(ids) > MAX_PRODUCTS:
+        return HttpResponseBadRequest('give 1 to %d names or ids' % MAX_PRODUCTS)
+
+    products = list(Product.objects.resolved().filter(Q(name__in=names) | Q(id__in=ids)).order_by('id'))
+    nsp_ids = []
+    sp_ids = []
+    for prod in products:
+        concrete = prod.resolve()
+        if isinstance(concrete, NspProduct):
+            nsp_ids.append(prod.id)
+        elif concrete is not None:
+            sp_ids.append(prod.id)
+
+    # NspProduct는 일별 최저가(DailyPrice), SpProduct는 Price를 사용
+    series = collections.defaultdict(lambda: ([], []))
+    for model, product_ids in ((DailyPrice, nsp_ids), (Price, sp_ids)):
+        if not product_ids:
+            continue
+        rows = model.objects.filter(product_id__in=product_ids)
+        if start:
+            rows = rows.filter(date__gte=start)
+        if end:
+            rows = rows.filter(date__lte=end)
+        for product_id, date, value in rows.order_by('product_id', 'date').values_list('product_id', 'date', 'value').iterator():
+            dates, values = series[product_id]
+            dates.append(date.isoformat())
+            values.append(value)
+
+    ret = []
+    for prod in products:
+        dates, values = series.get(prod.id, ([], []))
+        ret.append({'id': prod.id, 'name': prod.name, 'dates': dates, 'values': values})
+    return JsonResponse({'products': ret}, json_dumps_params={'ensure_ascii': False})
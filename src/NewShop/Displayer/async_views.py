@@ -0,0 +1,32 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.shortcuts import render
+from Displayer.views import get_product, page_version, market_key, fetch_market, product_context, MARKET_TTL
+
+# ASGI로 실행할 때 쓰는 비동기 상품 페이지 (Django 3.1 이상에서 동작).
+# 실시간 가격표 수집과 DB 작업(그래프, 뉴스, 기록)을 동시에 기다려서 응답 시간이 둘의 합이 아니라 긴 쪽 정도가 됨.
+# DB를 쓰는 호출은 thread_sensitive=True로 한 스레드에서만 실행하고 (asgiref 3.2에서는 기본값이 False라서 명시함),
+# DB를 쓰지 않는 수집(fetch_market)만 thread_sensitive=False로 다른 스레드에서 실행함.
+# 캐시도 DB 캐시이므로 캐시 읽기/쓰기는 DB 스레드에서 함
+
+
+async def market_table_async(keyword, prod, version):
+    key = market_key(prod, version)
+    ret = await sync_to_async(cache.get, thread_sensitive=True)(key)
+    if ret is None:
+        ret = await sync_to_async(fetch_market, thread_sensitive=False)(keyword)
+        await sync_to_async(cache.set, thread_sensitive=True)(key, ret, MARKET_TTL)
+    return ret
+
+
+async def search_async(request, keyword):
+    prod = await sync_to_async(get_product, thread_sensitive=True)(request, keyword)
+    version = await sync_to_async(page_version, thread_sensitive=True)(prod)
+    (market_list, avg, low), context = await asyncio.gather(
+        market_table_async(keyword, prod, version),
+        sync_to_async(product_context, thread_sensitive=True)(request, prod, version),
+    )
+    context.update({'market_list': market_list, 'average': avg, 'low': low})
+    # 뉴스 목록은 템플릿에서 읽으므로 렌더링도 DB 스레드에서 함
+    return await sync_to_async(render, thread_sensitive=True)(request, 'Displayer/product.html', context)
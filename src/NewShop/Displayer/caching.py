@@ -0,0 +1,55 @@
+import uuid
+from django.core.cache import caches
+
+# 캐시 무효화를 위한 버전. 데이터가 바뀌면 bump()로 버전을 바꾸고,
+# 캐시 키에 버전을 넣어 두면 예전 값은 더 이상 읽히지 않고 만료됨.
+# 크롤러 등 다른 프로세스의 bump()가 웹 서버에 보이려면 공유 캐시(settings.CACHES)여야 하고,
+# 버전 키는 정리(cull)되지 않는 'versions' 캐시에 둠
+
+
+def _token():
+    return uuid.uuid4().hex[:12]
+
+
+def version(key):
+    # 처음 만들 때도 임의의 값으로 시작함. 고정된 값(1)이면 버전 키가 없어졌다 다시 생겼을 때 예전 값이 다시 읽힘
+    versions = caches['versions']
+    v = versions.get(key)
+    if v is None:
+        token = _token()
+        versions.add(key, token, None)
+        v = versions.get(key, token)
+    return v
+
+
+def bump(key):
+    # 증가(incr)가 원자적이지 않은 백엔드(DB 캐시)에서도 동시에 두 번 bump해 같은 값이 되지 않도록 새 값을 씀
+    caches['versions'].set(key, _token(), None)
+
+
+def bookmarks_key(huser_id):
+    return 'bookmarks-version:%d' % huser_id
+
+
+NEWS_KEY = 'news-version'
+
+
+def product_key(product_id):
+    # 상품의 가격/뉴스/워드 클라우드가 바뀔 때마다 올라가는 버전
+    return 'product-version:%d' % product_id
+
+
+def bump_products(product_ids):
+    for product_id in set(product_ids):
+        bump(product_key(product_id))
+
+
+def product_version(product):
+    """
+    :param product: NspProduct or SpProduct. a SpProduct page also shows its NspProduct's news
+    """
+    v = str(version(product_key(product.id)))
+    parent_id = getattr(product, 'product_id', None)
+    if parent_id is not None:
+        v += '.' + str(version(product_key(parent_id)))
+    return v
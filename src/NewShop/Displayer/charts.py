@@ -0,0 +1,81 @@
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from Displayer.caching import product_version
+
+# 상품 페이지 가격 그래프에 쓰는 데이터. 가격/뉴스가 바뀌지 않으면 캐시된 값을 그대로 사용함
+# 긴 가격 기록은 settings.CHART_POINTS 개 이하로 줄여서 보냄
+
+
+def align_news(price_dates, news):
+    """
+    for each price date, the latest news on or before that date
+    :param price_dates: dates, newest first
+    :param news: list of (date, title), newest first
+    :return: hover text per price date (same order as price_dates)
+    """
+    ret = []
+    j = 0
+    # 둘 다 오래된 순으로 뒤집어 한 번씩만 훑음
+    news = news[::-1]
+    for date in reversed(price_dates):
+        while j < len(news) and news[j][0] <= date:
+            j += 1
+        if j > 0:
+            ret.append(news[j-1][1]+", ("+str(news[j-1][0])+")")
+        else:
+            ret.append("Not found")
+    return ret[::-1]
+
+
+def downsample(values, target):
+    """
+    min/max bucket downsampling. keeps the first and last point and, in each bucket, the lowest and highest one
+    so that price spikes survive.
+    :param values: sequence of numbers
+    :param target: max number of points to keep (at least 4: both ends and one bucket)
+    :return: indices of the kept points, in order
+    """
+    if target < 4:
+        raise ValueError('target must be at least 4')
+    n = len(values)
+    if n <= target:
+        return np.arange(n)
+    values = np.asarray(values)
+    buckets = (target - 2) // 2
+    inner = np.arange(1, n - 1)
+    bucket = (inner - 1) * buckets // (n - 2)
+    # 구간 번호, 값 순으로 정렬하면 구간마다 첫 번째가 최소, 마지막이 최대
+    order = np.lexsort((values[inner], bucket))
+    sorted_bucket = bucket[order]
+    edge = sorted_bucket[1:] != sorted_bucket[:-1]
+    first = np.concatenate(([True], edge))
+    last = np.concatenate((edge, [True]))
+    keep = np.sort(inner[order[first | last]])
+    return np.concatenate(([0], keep, [n - 1]))
+
+
+def price_chart(product):
+    """
+    :param product: Product (resolved to its subclass)
+    :return: dict of pr_dt (date strings), pr_vl (values), news_hover
+    """
+    concrete = product.resolve()
+    if concrete is None:
+        return {'pr_dt': [], 'pr_vl': [], 'news_hover': []}
+    points = settings.CHART_POINTS
+    key = 'chart:%d:%s:%d' % (concrete.id, product_version(concrete), points)
+    chart = cache.get(key)
+    if chart is None:
+        rows = list(concrete.getPrice().values_list('date', 'value'))
+        keep = downsample([row[1] for row in rows], points)
+        rows = [rows[i] for i in keep]
+        dates = [row[0] for row in rows]
+        news = list(concrete.getNews().values_list('date', 'title'))
+        chart = {
+            'pr_dt': [str(date) for date in dates],
+            'pr_vl': [row[1] for row in rows],
+            'news_hover': align_news(dates, news),
+        }
+        cache.set(key, chart, 60 * 60 * 24)
+    return chart
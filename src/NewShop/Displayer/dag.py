@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import threading
+import traceback
+import collections
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# 주기 작업(regular.run)을 단계(stage)의 DAG로 실행함.
+# 단계마다 자기 pool(thread: 크롤링 같은 I/O, process: NLP 같은 CPU 작업)을 쓰고, 앞 단계가 끝나야 시작하는 단계만 기다림.
+# 상품 단위로 끝난 작업은 체크포인트 파일에 기록해서, 중간에 죽은 실행을 다시 돌리면 남은 상품부터 이어서 함
+
+
+def _setup_django(setup=None, workers=1):
+    # process pool의 worker는 spawn으로 새로 뜨므로 Django를 다시 초기화함
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'NewShop.settings')
+    django.setup()
+    if setup is not None:
+        setup(workers)
+
+
+class Checkpoint(object):
+    def __init__(self, path, run):
+        """
+        append-only log of finished (stage, key). lines of another run (e.g. yesterday) are discarded
+        :param path: jsonl file
+        :param run: id of this run (same id -> resume)
+        """
+        self.path = path
+        self.run = run
+        self.lock = threading.Lock()
+        self.done = collections.defaultdict(set)
+        lines = []
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        # 기록 중에 죽어서 잘린 마지막 줄
+                        continue
+                    if row.get('run') == run:
+                        self.done[row['stage']].add(row['key'])
+                        lines.append(line)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+
+    def is_done(self, stage, key):
+        return key in self.done[stage]
+
+    def mark(self, stage, keys):
+        if not keys:
+            return
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for key in keys:
+                    f.write(json.dumps({'run': self.run, 'stage': stage, 'key': key}) + '\n')
+            self.done[stage].update(keys)
+
+
+class Stage(object):
+    def __init__(self, name, func, items=None, after=(), kind='thread', workers=4, commit=None, commit_every=100, finish=None, setup=None):
+        """
+        :param func: called with each item (or once without arguments when items is None).
+            an item is done when func returns something other than False
+        :param items: callable returning a list of (key, item). keys are recorded in the checkpoint, so they must be
+            JSON values (ids); for kind='process' func and items must be picklable
+        :param after: names of the stages that must finish first
+        :param kind: 'thread' or 'process'
+        :param commit: called before finished keys are checkpointed (e.g. Ingestor.flush), so that a key is only
+            recorded once its rows are in the database
+        :param commit_every: checkpoint after this many finished items
+        :param finish: called once after every item
+        :param setup: kind='process' only. called once in every worker process after Django is set up, with the
+            number of worker processes of the stage (e.g. to split a rate limit among them); must be picklable
+        """
+        self.name = name
+        self.func = func
+        self.items = items
+        self.after = list(after)
+        self.kind = kind
+        self.workers = workers
+        self.commit = commit
+        self.commit_every = commit_every
+        self.finish = finish
+        self.setup = setup
+        self.finished = threading.Event()
+        self.stats = collections.Counter()
+        self.elapsed = 0.0
+
+
+class Dag(object):
+    def __init__(self, stages, checkpoint=None, max_workers=8):
+        """
+        :param stages: list of Stage
+        :param checkpoint: Checkpoint (default: no resume)
+        :param max_workers: max number of items running at once over every stage
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            for name in stage.after:
+                if name not in self.stages:
+                    raise ValueError(f'{stage.name}: unknown stage {name}')
+        self.checkpoint = checkpoint
+        self.max_workers = max_workers
+        self.slots = threading.BoundedSemaphore(max_workers)
+
+    def make_pool(self, stage):
+        workers = min(stage.workers, self.max_workers)
+        if stage.kind == 'process':
+            return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_setup_django, initargs=(stage.setup, workers))
+        return ThreadPoolExecutor(workers)
+
+    def run_items(self, stage):
+        items = stage.items()
+        if self.checkpoint is not None:
+            todo = [(key, item) for key, item in items if not self.checkpoint.is_done(stage.name, key)]
+            stage.stats['skipped'] = len(items) - len(todo)
+            items = todo
+        lock = threading.Lock()
+        finished = []
+
+        def save():
+            # commit 후에 체크포인트를 남김 (commit 전에 죽으면 그 상품은 다시 함)
+            with lock:
+                keys = finished[:]
+                del finished[:]
+            if stage.commit is not None:
+                stage.commit()
+            if self.checkpoint is not None:
+                self.checkpoint.mark(stage.name, keys)
+
+        def done(key, future):
+            self.slots.release()
+            try:
+                ok = future.result() is not False
+            except Exception:
+                traceback.print_exc()
+                ok = False
+            with lock:
+                stage.stats['done' if ok else 'failed'] += 1
+                if ok:
+                    finished.append(key)
+
+        pool = self.make_pool(stage)
+        try:
+            submitted = 0
+            for key, item in items:
+                # 전체 단계를 합쳐 max_workers개까지만 동시에 실행
+                self.slots.acquire()
+                future = pool.submit(stage.func, item)
+                future.add_done_callback(lambda f, key=key: done(key, f))
+                submitted += 1
+                if submitted % stage.commit_every == 0:
+                    save()
+        finally:
+            pool.shutdown()
+        if stage.finish is not None:
+            stage.finish()
+        save()
+
+    def run_stage(self, stage):
+        for name in stage.after:
+            self.stages[name].finished.wait()
+        start = time.time()
+        try:
+            if stage.items is None:
+                stage.func()
+                stage.stats['done'] += 1
+            else:
+                self.run_items(stage)
+        except Exception:
+            traceback.print_exc()
+            stage.stats['error'] += 1
+        finally:
+            stage.elapsed = time.time() - start
+            stage.finished.set()
+
+    def run(self):
+        """
+        run every stage; a stage starts as soon as the stages it comes after are finished
+        :return: dict of stage name -> counters and elapsed seconds
+        """
+        threads = [threading.Thread(target=self.run_stage, args=(stage,), name=f'stage-{name}')
+                   for name, stage in self.stages.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report()
+
+    def report(self):
+        return {name: dict(stage.stats, elapsed=stage.elapsed) for name, stage in self.stages.items()}
+
+    def print_report(self):
+        for name, stats in self.report().items():
+            print(f"{name}\tdone: {stats.get('done', 0)}\tfailed: {stats.get('failed', 0)}"
+                  f"\tskipped: {stats.get('skipped', 0)}\telapsed: {stats['elapsed']:.1f}s")
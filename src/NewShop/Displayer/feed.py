@@ -0,0 +1,59 @@
+import datetime
+from django.core.cache import cache
+from django.db.models import Q
+from Displayer.models import News, Favor
+from Displayer.caching import version, bookmarks_key, NEWS_KEY
+
+# 홈 화면의 즐겨찾기 상품 뉴스 피드.
+# 즐겨찾기한 상품의 NspProduct(SpProduct라면 상위 NspProduct) 뉴스를 쿼리 한 번으로 (date, id) 역순으로 가져옴.
+# 다음 페이지는 offset 대신 마지막 (date, id)를 cursor로 넘겨 이어서 읽음
+
+PAGE_SIZE = 30
+
+
+def bookmarked_categories(huser):
+    ids = set()
+    for nsp_id, parent_id in Favor.objects.filter(user=huser).values_list('product__nspproduct', 'product__spproduct__product'):
+        if nsp_id is not None:
+            ids.add(nsp_id)
+        if parent_id is not None:
+            ids.add(parent_id)
+    return ids
+
+
+def parse_cursor(cursor):
+    try:
+        date, pk = cursor.split('_')
+        return datetime.date.fromisoformat(date), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _page(huser, cursor, size):
+    news = News.objects.filter(product_id__in=bookmarked_categories(huser)).order_by('-date', '-id')
+    if cursor is not None:
+        date, pk = cursor
+        news = news.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+    rows = list(news[:size+1])
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = '%s_%d' % (rows[-1].date.isoformat(), rows[-1].id)
+    return rows, next_cursor
+
+
+def feed_page(huser, cursor=None, size=PAGE_SIZE):
+    """
+    :param cursor: 'YYYY-MM-DD_id' of the last news of the previous page
+    :return: (list of News, cursor of the next page or None)
+    """
+    cursor = parse_cursor(cursor)
+    if cursor is not None:
+        return _page(huser, cursor, size)
+    # 첫 페이지만 캐시. 즐겨찾기가 바뀌거나 새 뉴스가 저장되면 버전이 바뀌어 다시 계산됨
+    key = 'feed:%d:%d:%s:%s' % (huser.id, size, version(bookmarks_key(huser.id)), version(NEWS_KEY))
+    page = cache.get(key)
+    if page is None:
+        page = _page(huser, None, size)
+        cache.set(key, page, 60 * 60)
+    return page
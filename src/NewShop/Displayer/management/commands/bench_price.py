@@ -0,0 +1,58 @@
+import time
+import random
+import datetime
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from Displayer.models import NspProduct, SpProduct, Price, DailyPrice
+
+
+# 예전 NspProduct.getPrice 구현. 비교용으로만 남겨 둠
+def legacy_price(nsp):
+    price_list = Price.objects.none()
+    for sp in nsp.brand.all():
+        price_list |= sp.getPrice()
+    same = ''
+    for pr in price_list:
+        date = pr.date
+        if date != same:
+            price_list = price_list.exclude(value__gt=pr.value, date=pr.date)
+        else:
+            price_list = price_list.exclude(pk=pr.pk)
+        same = date
+    return price_list
+
+
+class Command(BaseCommand):
+    help = 'NspProduct.getPrice 벤치마크. 임시 데이터를 만들어 측정한 뒤 모두 롤백합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--brands', type=int, default=30)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--legacy', action='store_true', help='예전 구현도 측정 (매우 느림)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            nsp = NspProduct.objects.create(name='__bench_price__')
+            brands = [SpProduct.objects.create(name=f'__bench_price_{i}__', product=nsp) for i in range(options['brands'])]
+            today = datetime.date.today()
+            rows = [Price(product=sp, value=random.randint(10000, 20000), date=today - datetime.timedelta(days=d))
+                    for sp in brands for d in range(options['days'])]
+            Price.objects.bulk_create(rows, batch_size=1000)
+            self.stdout.write(f'{len(rows)} price rows, {options["days"]} days')
+
+            start = time.time()
+            DailyPrice.rebuild([nsp])
+            self.stdout.write(f'rollup rebuild (grouped query): {time.time() - start:.3f}s')
+
+            start = time.time()
+            series = list(nsp.getPrice())
+            self.stdout.write(f'getPrice: {time.time() - start:.3f}s, {len(series)} points')
+
+            if options['legacy']:
+                start = time.time()
+                try:
+                    legacy = [(pr.date, pr.value) for pr in legacy_price(nsp).order_by('-date')]
+                    self.stdout.write(f'legacy: {time.time() - start:.3f}s, same result: {legacy == [(pr.date, pr.value) for pr in series]}')
+                except Exception as e:
+                    self.stdout.write(f'legacy failed after {time.time() - start:.3f}s: {e}')
+            transaction.set_rollback(True)
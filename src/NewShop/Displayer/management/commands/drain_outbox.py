@@ -0,0 +1,34 @@
+import time
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from Displayer.outbox import drain
+from Displayer.outbox_stub import SmtpStub, SensStub
+
+
+class Command(BaseCommand):
+    help = 'Notification(outbox)에 쌓인 메일과 문자를 발송합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='종료하지 않고 계속 발송')
+        # 인증 번호/비밀번호 재설정 메일도 이 worker가 보내므로 간격을 짧게 둠
+        parser.add_argument('--interval', type=float, default=1.0)
+        parser.add_argument('--stub', action='store_true', help='실제로 보내지 않고 로컬 SMTP/SENS 서버로 보냄')
+
+    def handle(self, *args, **options):
+        connection = None
+        sens_url = None
+        if options['stub']:
+            smtp = SmtpStub().start()
+            sens = SensStub().start()
+            connection = get_connection('django.core.mail.backends.smtp.EmailBackend', host=smtp.host, port=smtp.port,
+                                        username='', password='', use_tls=False)
+            sens_url = sens.url
+        while True:
+            result = drain(connection=connection, sens_url=sens_url)
+            if result.get('sent') or result.get('failed'):
+                self.stdout.write(str(result))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        if options['stub']:
+            self.stdout.write(f'stub received {len(smtp.messages)} mails, {len(sens.requests)} sms requests')
@@ -0,0 +1,42 @@
+import time
+import statistics
+import concurrent.futures
+import requests
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = '실행 중인 서버에 동시 요청을 보내 처리량과 응답 시간을 측정합니다. 여러 url을 주면 차례로 측정해 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='예: http://127.0.0.1:8000/product/ssd http://127.0.0.1:8001/async/product/ssd')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+
+    def fetch(self, session, url):
+        start = time.time()
+        try:
+            ok = session.get(url, timeout=60).status_code == 200
+        except requests.RequestException:
+            ok = False
+        return ok, time.time() - start
+
+    def run(self, url, total, concurrency):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        start = time.time()
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(lambda _: self.fetch(session, url), range(total)))
+        elapsed = time.time() - start
+        latencies = sorted(t for _, t in results)
+        failed = sum(1 for ok, _ in results if not ok)
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(f'{url}\n'
+                          f'  {total / elapsed:.1f} req/s, {failed} failed, '
+                          f'p50 {statistics.median(latencies) * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms')
+
+    def handle(self, *args, **options):
+        for url in options['urls']:
+            self.run(url, options['requests'], options['concurrency'])
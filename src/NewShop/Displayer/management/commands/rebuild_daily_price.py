@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from Displayer.models import NspProduct, DailyPrice
+
+
+class Command(BaseCommand):
+    help = 'Price 테이블 전체로부터 DailyPrice 요약 테이블을 다시 만듭니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='다시 만들 NspProduct 이름 (기본: 전체)')
+
+    def handle(self, *args, **options):
+        products = None
+        if options['names']:
+            products = NspProduct.objects.filter(name__in=options['names'])
+        start = time.time()
+        count = DailyPrice.rebuild(products)
+        self.stdout.write(self.style.SUCCESS(f'{count} daily rows in {time.time() - start:.2f}s'))
@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from Displayer.models import NspProduct, NounCount
+
+
+class Command(BaseCommand):
+    help = '저장된 뉴스 제목 전체로부터 워드 클라우드용 NounCount 테이블을 다시 만듭니다. (처음 채우는 것은 migrate가 함)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='다시 만들 NspProduct 이름 (기본: 전체)')
+
+    def handle(self, *args, **options):
+        products = None
+        if options['names']:
+            products = NspProduct.objects.filter(name__in=options['names'])
+        start = time.time()
+        count = NounCount.rebuild(products)
+        self.stdout.write(self.style.SUCCESS(f'{count} noun rows in {time.time() - start:.2f}s'))
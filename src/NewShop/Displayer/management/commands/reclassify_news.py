@@ -0,0 +1,95 @@
+import os
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from Displayer.models import News
+from Displayer.caching import bump, bump_products, NEWS_KEY
+from Displayer.news.nlp_main import load_model, classify
+from Displayer.news.TextRank import keysentence_summarizer
+from Displayer.news.store import get_store
+
+
+class Command(BaseCommand):
+    help = '새로 학습한 모델로 저장된 뉴스의 분류(subj)를 다시 계산합니다. 중단된 경우 체크포인트부터 이어서 진행합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default='Displayer/news/best_model.pth')
+        parser.add_argument('--chunk', type=int, default=500)
+        parser.add_argument('--checkpoint', default=os.path.join(settings.BASE_DIR, 'reclassify_news.json'))
+        parser.add_argument('--restart', action='store_true', help='체크포인트를 무시하고 처음부터 진행')
+
+    def load_checkpoint(self, path, model_path):
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            ckpt = json.load(f)
+        if ckpt.get('model') != model_path or ckpt.get('model_mtime') != os.path.getmtime(model_path):
+            # 다른 모델로 진행하던 체크포인트는 쓰지 않음
+            return 0
+        return ckpt['last_id']
+
+    def save_checkpoint(self, path, model_path, last_id):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'model': model_path, 'model_mtime': os.path.getmtime(model_path), 'last_id': last_id}, f)
+        os.replace(tmp, path)
+
+    def inputs(self, store, rows):
+        """
+        summarize the stored body again. rows without a stored body (collected before the store existed) are
+        skipped: the model was trained on summaries, so a prediction on the title alone would not be comparable
+        :return: (rows with a body, their key sentences)
+        """
+        # 묶음의 본문을 디스크에 저장된 순서대로 한 번에 읽음 (세그먼트 파일마다 한 번만 엶)
+        articles = dict(store.iter_articles([row.url for row in rows]))
+        ret_rows = []
+        ret = []
+        for row in rows:
+            article = articles.get(row.url)
+            if article is not None and article['sentences']:
+                ret_rows.append(row)
+                ret.append(keysentence_summarizer(article['sentences'], d_f=0.85, epochs=30, threshold=0.001, T=5))
+        return ret_rows, ret
+
+    def handle(self, *args, **options):
+        model_path = options['model']
+        ckpt_path = options['checkpoint']
+        model, vocab = load_model(model_path)
+        store = get_store()
+        last_id = 0 if options['restart'] else self.load_checkpoint(ckpt_path, model_path)
+        if last_id:
+            self.stdout.write(f'resume after id {last_id}')
+
+        done = 0
+        changed = 0
+        skipped = 0
+        start = time.time()
+        while True:
+            # keyset pagination: offset 없이 id 순으로 다음 묶음을 가져옴
+            rows = list(News.objects.filter(id__gt=last_id).order_by('id').only('id', 'url', 'title', 'subj', 'product_id')[:options['chunk']])
+            if not rows:
+                break
+            stored, inputs = self.inputs(store, rows)
+            skipped += len(rows) - len(stored)
+            predicted = classify(model, vocab, inputs) if stored else []
+            update = []
+            for row, subj in zip(stored, predicted):
+                if row.subj != subj:
+                    row.subj = subj
+                    update.append(row)
+            with transaction.atomic():
+                News.objects.bulk_update(update, ['subj'])
+                if update:
+                    # 분류가 바뀐 뉴스가 보이는 홈 피드와 상품 페이지 캐시 무효화
+                    product_ids = [row.product_id for row in update]
+                    transaction.on_commit(lambda: bump(NEWS_KEY))
+                    transaction.on_commit(lambda: bump_products(product_ids))
+            last_id = rows[-1].id
+            self.save_checkpoint(ckpt_path, model_path, last_id)
+            done += len(rows)
+            changed += len(update)
+            elapsed = time.time() - start
+            self.stdout.write(f'{done} rows ({changed} changed, {skipped} skipped), last id {last_id}, {done / elapsed:.1f} rows/s')
+        self.stdout.write(self.style.SUCCESS(f'reclassified {done} rows, {changed} changed, {skipped} skipped (no stored body)'))
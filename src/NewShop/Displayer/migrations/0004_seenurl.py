@@ -0,0 +1,25 @@
+# Generated by Django 3.0.5 on 2026-10-19 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Displayer', '0003_wordcloudimg'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeenUrl',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seen_url', to='Displayer.NspProduct')),
+            ],
+            options={
+                'unique_together': {('product', 'url')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.5 on 2026-10-19 11:03
+
+from django.db import migrations, models
+from django.db.models import Min, Max, Avg, Count
+import django.db.models.deletion
+
+
+def fill_daily_price(apps, schema_editor):
+    Price = apps.get_model('Displayer', 'Price')
+    DailyPrice = apps.get_model('Displayer', 'DailyPrice')
+    rows = Price.objects.values('product__product_id', 'date').annotate(
+        low=Min('value'), high=Max('value'), mean=Avg('value'), count=Count('id'))
+    DailyPrice.objects.bulk_create([DailyPrice(product_id=row['product__product_id'], date=row['date'], value=row['low'],
+                                               high=row['high'], mean=row['mean'], count=row['count']) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Displayer', '0004_seenurl'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPrice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('value', models.IntegerField()),
+                ('high', models.IntegerField()),
+                ('mean', models.FloatField()),
+                ('count', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily', to='Displayer.NspProduct')),
+            ],
+            options={
+                'unique_together': {('product', 'date')},
+            },
+        ),
+        migrations.RunPython(fill_daily_price, migrations.RunPython.noop),
+    ]
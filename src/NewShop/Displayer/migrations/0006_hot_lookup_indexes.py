@@ -0,0 +1,46 @@
+# Generated by Django 3.0.5 on 2026-10-19 11:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def dedup_news_url(apps, schema_editor):
+    # url에 unique를 걸기 전에 같은 url로 중복 저장된 뉴스는 가장 먼저 저장된 것만 남김
+    News = apps.get_model('Displayer', 'News')
+    dups = News.objects.values('url').annotate(first=Min('id'), n=Count('id')).filter(n__gt=1)
+    for row in dups:
+        News.objects.filter(url=row['url']).exclude(id=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Displayer', '0005_dailyprice'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedup_news_url, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='news',
+            name='title',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='news',
+            name='url',
+            field=models.URLField(unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(fields=['product', 'date'], name='news_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='price',
+            index=models.Index(fields=['product', 'date'], name='price_product_date_idx'),
+        ),
+    ]
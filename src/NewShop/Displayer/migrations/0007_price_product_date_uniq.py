@@ -0,0 +1,38 @@
+# Generated by Django 3.0.5 on 2026-10-19 12:15
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Max, Avg
+
+
+def dedup_price(apps, schema_editor):
+    # 같은 날 여러 번 저장된 가격은 가장 먼저 저장된 것만 남김
+    Price = apps.get_model('Displayer', 'Price')
+    SpProduct = apps.get_model('Displayer', 'SpProduct')
+    DailyPrice = apps.get_model('Displayer', 'DailyPrice')
+    dups = Price.objects.values('product_id', 'date').annotate(first=Min('id'), n=Count('id')).filter(n__gt=1)
+    touched = set()
+    for row in dups:
+        Price.objects.filter(product_id=row['product_id'], date=row['date']).exclude(id=row['first']).delete()
+        touched.add((row['product_id'], row['date']))
+    # 0005에서 중복 포함 데이터로 만든 DailyPrice도 남은 가격으로 다시 계산
+    parents = dict(SpProduct.objects.filter(id__in=set(pid for pid, date in touched)).values_list('id', 'product_id'))
+    for nsp_id, date in set((parents[pid], date) for pid, date in touched if pid in parents):
+        agg = Price.objects.filter(product__product_id=nsp_id, date=date).aggregate(
+            low=Min('value'), high=Max('value'), mean=Avg('value'), count=Count('id'))
+        DailyPrice.objects.filter(product_id=nsp_id, date=date).update(
+            value=agg['low'], high=agg['high'], mean=agg['mean'], count=agg['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Displayer', '0006_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedup_price, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='price',
+            constraint=models.UniqueConstraint(fields=('product', 'date'), name='price_product_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.0.5 on 2026-10-19 13:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Displayer', '0007_price_product_date_uniq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.IntegerField()),
+                ('to', models.CharField(max_length=254)),
+                ('title', models.CharField(default='', max_length=200)),
+                ('content', models.TextField()),
+                ('status', models.IntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_try', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.CharField(default='', max_length=400)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['status', 'next_try'], name='notification_due_idx'),
+        ),
+    ]
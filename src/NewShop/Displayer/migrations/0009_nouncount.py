@@ -0,0 +1,31 @@
+# Generated by Django 3.0.5 on 2026-10-19 19:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Displayer', '0008_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordcloudimg',
+            name='signature',
+            field=models.CharField(default='', max_length=40),
+        ),
+        migrations.CreateModel(
+            name='NounCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('noun', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nouns', to='Displayer.NspProduct')),
+            ],
+            options={
+                'unique_together': {('product', 'noun')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.5 on 2026-10-19 21:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Displayer', '0009_nouncount'),
+    ]
+
+    operations = [
+        # price_product_date_uniq가 같은 (product, date) 인덱스를 만들므로 중복 인덱스는 지움
+        migrations.RemoveIndex(
+            model_name='price',
+            name='price_product_date_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.5 on 2026-10-19 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Displayer', '0010_remove_price_product_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='claim',
+            field=models.CharField(db_index=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.5 on 2026-10-20 10:05
+
+from django.db import migrations
+
+
+def backfill_noun_counts(apps, schema_editor):
+    # 0009에서 비어 있는 NounCount를 만든 뒤로는 새 뉴스 제목만 더해졌으므로, 저장된 뉴스 제목 전체로 다시 셈.
+    # 이전에 만든 워드 클라우드가 새 제목만으로 그린 그림으로 덮어써지지 않게 함 (NounCount.rebuild와 같은 계산)
+    from Displayer.news.cloud import noun_counts
+    News = apps.get_model('Displayer', 'News')
+    NounCount = apps.get_model('Displayer', 'NounCount')
+    product_ids = News.objects.order_by().values_list('product_id', flat=True).distinct()
+    for pid in list(product_ids):
+        titles = list(News.objects.filter(product_id=pid).values_list('title', flat=True).iterator())
+        NounCount.objects.filter(product_id=pid).delete()
+        NounCount.objects.bulk_create([NounCount(product_id=pid, noun=noun, count=n) for noun, n in noun_counts(titles).items()],
+                                      batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Displayer', '0011_notification_claim'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_noun_counts, migrations.RunPython.noop),
+    ]
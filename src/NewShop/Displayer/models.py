@@ -1,14 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Min, Max, Avg, Count
 from django.conf import settings
-from NewShop import local_settings
-from NewShop.settings import MEDIA_ROOT
-from django.core.mail import EmailMessage
-import datetime
-import requests
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
 import pandas as pd
 import abc
-import time
-import sys, os, hashlib, hmac, base64
+import io
 # Create your models here.
 
 class HUser(models.Model):
@@ -23,41 +20,22 @@ class HUser(models.Model):
     '''
     DB를 건드리는 기능 : 회원가입, 로그인, 즐겨찾기 저장/삭제, 검색(가격 표시), 마이페이지 이미지/이름/알람 수단 변경, 알람 설정
     '''
-    def sendEmail(self, title, content):
-        email = EmailMessage(
-            subject=title,
-            body=content,
-            to=[self.user.email],
-            )
-        email.send()
-
-    def sendSMS(self, content):
+    # 메일과 문자는 바로 보내지 않고 Notification(outbox)에 쌓아 둠. 실제 발송은 Displayer/outbox.py의 drain()
+    # outbox(list)를 주면 저장하지 않고 거기에 담기만 함. 알림을 많이 보낼 때 모아서 bulk_create하기 위함
+    # 인증 메일/문자도 요청 안에서 보내지 않음. drain_outbox --loop가 몇 초 안에 보냄
+    def sendEmail(self, title, content, outbox=None):
+        self._notify(Notification(channel=Notification.EMAIL, to=self.user.email, title=title, content=content), outbox)
+
+    def sendSMS(self, content, outbox=None):
         if not self.permit:
             return
-        url='https://sens.apigw.ntruss.com'
-        uri='/sms/v2/services/'+local_settings.svc_id+'/messages'
-        data = {
-            "type": "SMS",
-            "from": local_settings.hp,
-            # 이 부분은 저의 전화번호가 넷상에 남게 되는 실수가 있을 수 있기 때문에 sendSMS()는 로컬 테스트 금지입니다.
-            # 만약 다른 기능 테스트 중 이 함수에서 인터프리터 오류가 발생한다면, local_settings에서 끌어온 것들은 빈 문자열로 수정하여 테스트해주시기 바랍니다.
-            "messages":[{"to": self.phone}],
-            "content": content
-        }
-        access_key=local_settings.access_key
-        secret_key=bytes(local_settings.secret_key,'UTF-8')
-        stamp=str(int(time.time()*1000))
-        msg = "POST "+uri+"\n"+stamp+"\n"+access_key
-        msg=bytes(msg,'UTF-8')
-        sv2=base64.b64encode(hmac.new(secret_key,msg,digestmod=hashlib.sha256).digest())
-        headers={
-            "Content-Type": "application/json; charset=utf-8",
-            "x-ncp-iam-access-key": access_key,
-            "x-ncp-apigw-signature-v2":sv2,
-            "x-ncp-apigw-timestamp": stamp
-        }
-        res=requests.post(url+uri, json=data, headers=headers)
-        res.raise_for_status()
+        self._notify(Notification(channel=Notification.SMS, to=self.phone, content=content), outbox)
+
+    def _notify(self, row, outbox):
+        if outbox is not None:
+            outbox.append(row)
+            return
+        row.save()
 
     def phoneAuth(self, input):        
         if self.phonekey.all()[0].value==int(input):
@@ -101,122 +79,84 @@ class Alarm(models.Model):
     def __str__(self):
         return str(self.user)+' - '+str(self.product)
 
+class ProductQuerySet(models.QuerySet):
+    def resolved(self):
+        # 하위 클래스 테이블을 같이 조인해서 resolve()가 추가 쿼리 없이 동작하게 함
+        return self.select_related('nspproduct', 'spproduct', 'spproduct__product')
+
+
 class Product(models.Model):    #상표 없는 것과 있는 것의 공통 규약을 위한 추상 클래스
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     imgUrl = models.CharField(max_length=200, null=True)
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return self.name
-    
+
+    def resolve(self):
+        # 실제 하위 클래스(NspProduct, SpProduct) 인스턴스. 찾은 결과는 인스턴스에 저장해 다시 조회하지 않음
+        if '_concrete' not in self.__dict__:
+            concrete = None
+            if isinstance(self, (NspProduct, SpProduct)):
+                concrete = self
+            else:
+                for attr in ('nspproduct', 'spproduct'):
+                    try:
+                        concrete = getattr(self, attr)
+                        break
+                    except ObjectDoesNotExist:
+                        pass
+            self._concrete = concrete
+        return self._concrete
+
     @abc.abstractmethod
     def getNews(self):
-        n = NspProduct.objects.all().filter(name=self.name)
-        s = SpProduct.objects.all().filter(name=self.name)
-        if n.count()>0:
-            return n.get(name=self.name).getNews() 
-        elif s.count()>0:
-            return s.get(name=self.name).getNews()
-        else:
+        concrete = self.resolve()
+        if concrete is None:
             return []
+        return concrete.getNews()
 
     @abc.abstractmethod
     def getPrice(self):
-        n = NspProduct.objects.all().filter(name=self.name)
-        s = SpProduct.objects.all().filter(name=self.name)
-        if n.count()>0:
-            return n.get(name=self.name).getPrice() 
-        elif s.count()>0:
-            return s.get(name=self.name).getPrice()
-        else:
+        concrete = self.resolve()
+        if concrete is None:
             return []
+        return concrete.getPrice()
 
     @abc.abstractmethod
     def getInfluence(self):
-        n = NspProduct.objects.all().filter(name=self.name)
-        s = SpProduct.objects.all().filter(name=self.name)
-        if n.count()>0:
-            return n.get(name=self.name).getInfluence()
-        elif s.count()>0:
-            return s.get(name=self.name).getInfluence()
-        else:
+        concrete = self.resolve()
+        if concrete is None:
             return []
+        return concrete.getInfluence()
 
     def getPriceByTable(self):
-        if not os.path.isdir('./xlsx'):
-            os.mkdir('./xlsx')
-        filepath = "./xlsx/"+str(self.name)+'.xlsx'
-        data = self.getPrice()
-        data_list = []        
-        for row in data:
-            data_list.append([row.date, row.value])
+        # 가격 표를 엑셀 파일 내용(bytes)으로 만듦. 디스크에는 쓰지 않음
+        concrete = self.resolve()
+        data_list = []
+        if concrete is not None:
+            data_list = list(concrete.getPrice().values_list('date', 'value'))
         data_frame = pd.DataFrame(data=data_list, columns=['일자', '가격'])
-        data_frame.to_excel(filepath)
-        return filepath
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            data_frame.to_excel(writer)
+        return buffer.getvalue()
 
     def sendPriceAlarm(self):  # 가격에 관한 알림만. 반드시 호출하기 전에 데이터베이스에 새로운 가격이 저장된 상태여야 함
-        alarms=self.alarm.all()
-        pr=self.getPrice()[0].value
-        for a in alarms:
-            if a.lower>pr and a.reuse:
-                a.reuse=False
-                a.save()
-                if int(a.user.alarmMethod/2)==1:
-                    msg = '[NewShop]\n'
-                    msg += (a.user.user.username+'님, '+self.name+'의 가격이 '+str(pr)+'이 되었으니 사이트에서 확인해 주세요.')
-                    a.user.sendSMS(msg)
-                if a.user.alarmMethod%2==1:
-                    title='[NewShop]가격 변동 알림 ('+self.name+')'
-                    msg = (a.user.user.username+'님, '+self.name+'의 가격이 '+str(pr)+'이 되었으니 사이트에서 확인해 주세요.')
-                    a.user.sendEmail(title, msg)
-            elif a.upper<pr and not a.reuse:
-                a.reuse=True
-                a.save()
-                if int(a.user.alarmMethod/2)==1:
-                    msg = '[NewShop]\n'
-                    msg += (a.user.user.username+'님, '+self.name+'의 가격이 '+str(pr)+'이 되었으니 사이트에서 확인해 주세요.')
-                    a.user.sendSMS(msg)
-                if a.user.alarmMethod%2==1:
-                    title='[NewShop]가격 변동 알림 ('+self.name+')'
-                    msg = (a.user.user.username+'님, '+self.name+'의 가격이 '+str(pr)+'이 되었으니 사이트에서 확인해 주세요.')
-                    a.user.sendEmail(title, msg)
-
-    def sendNewsAlarm(self):  # 뉴스에 관한 알림만. 반드시 호출하기 전에 데이터베이스에 새로운 뉴스가 저장된 상태여야 함. 1일 1회 기준
-        alarms=self.alarm.all()
-        if self.getNews().first().date == datetime.date.today():
-            for a in alarms:
-                if a.news_alarm:
-                    if int(a.user.alarmMethod/2)==1:
-                        msg = '[NewShop]\n'
-                        msg += (a.user.user.username+'님 안녕하세요. '+self.name+'과 관련한 새로운 소식이 있으니, 사이트에서 확인해 주시기 바랍니다.')
-                        a.user.sendSMS(msg)
-                    if a.user.alarmMethod%2==1:
-                        title='[NewShop]뉴스 알림 ('+self.name+')'
-                        msg = (a.user.user.username+'님 안녕하세요. '+self.name+'과 관련한 새로운 소식이 있으니, 사이트에서 확인해 주시기 바랍니다.')
-                        a.user.sendEmail(title, msg)
+        # 판정은 Displayer/alarms.py에서 SQL로 처리함 (alarms가 models를 import하므로 여기서 불러옴)
+        from Displayer.alarms import send_price_alarms
+        send_price_alarms([self.id])
+
 
 class NspProduct(Product): #상표 무관 product 키워드를 말함
     field = models.CharField(max_length=50,null=True)
     influence = models.CharField(max_length=100,null=True)
     def getNews(self):
         return self.news.all().order_by('-date')
-    # 날짜별 가장 낮은 가격 쿼리셋 리턴. 함수는 Product(부모)에서만 부를 거기 때문에 반드시 양식이 동일해야 함
+    # 날짜별 가장 낮은 가격 쿼리셋 리턴(최신 날짜부터). 함수는 Product(부모)에서만 부를 거기 때문에 반드시 양식이 동일해야 함
+    # Price가 저장될 때 갱신되는 DailyPrice 요약 테이블을 그대로 읽음. 원소는 date, value(최저가)를 가짐
     def getPrice(self):
-        spproduct = self.brand.all()        
-        price_list = Price.objects.none()
-        for sp in spproduct:
-            price_list |= sp.getPrice()
-        price_list.order_by('-date','value')
-
-        date = ''
-        same = ''
-        
-        for pr in price_list:
-            date=pr.date
-            if date != same:
-                price_list=price_list.exclude(value__gt=pr.value,date=pr.date)
-            else:
-                price_list=price_list.exclude(pk=pr.pk)
-            same=date            
-        return price_list
+        return self.daily.all().order_by('-date')
 
     def getInfluence(self):
         try:
@@ -239,22 +179,138 @@ class News(models.Model):
     product = models.ForeignKey("NspProduct", related_name='news', on_delete=models.CASCADE)
     date = models.DateField()
     piece = models.CharField(default="", max_length=200)
-    title = models.CharField(max_length=200)
+    title = models.CharField(max_length=200, db_index=True)
     subj = models.IntegerField()
-    url = models.URLField(max_length=200)
+    url = models.URLField(max_length=200, unique=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['product', 'date'], name='news_product_date_idx')]
 
     def __str__(self):
         return self.title
     
 
+class SeenUrl(models.Model):
+    # 상품별로 이미 수집한 기사 url. 크롤링 시 기사를 받아오기 전에 확인함
+    product = models.ForeignKey("NspProduct", related_name='seen_url', on_delete=models.CASCADE)
+    url = models.URLField(max_length=200)
+
+    class Meta:
+        unique_together = ('product', 'url')
+
+    def __str__(self):
+        return str(self.product)+' - '+self.url
+
+
 class Price(models.Model):
     product = models.ForeignKey("SpProduct",related_name='price', on_delete=models.CASCADE)
     value = models.IntegerField()
     date = models.DateField()
 
+    class Meta:
+        # SpProduct 하나당 하루에 가격 하나. 일괄 저장 시 충돌은 무시함 (이 제약의 인덱스가 상품별 가격 조회에도 쓰임)
+        constraints = [models.UniqueConstraint(fields=['product', 'date'], name='price_product_date_uniq')]
+
+    def __str__(self):
+        return str(self.product)+' '+str(self.date)
+
+class DailyPrice(models.Model):
+    # NspProduct의 날짜별 브랜드 가격 요약. value는 최저가(Price와 같은 이름이라 getPrice 결과로 그대로 쓸 수 있음)
+    product = models.ForeignKey("NspProduct", related_name='daily', on_delete=models.CASCADE)
+    date = models.DateField()
+    value = models.IntegerField()
+    high = models.IntegerField()
+    mean = models.FloatField()
+    count = models.IntegerField()
+
+    class Meta:
+        unique_together = ('product', 'date')
+
     def __str__(self):
         return str(self.product)+' '+str(self.date)
 
+    @staticmethod
+    def aggregate(prices):
+        # (NspProduct, 날짜)로 묶은 최저/최고/평균/개수
+        return prices.values('product__product_id', 'date').annotate(
+            low=Min('value'), high=Max('value'), mean=Avg('value'), count=Count('id'))
+
+    @classmethod
+    def refresh(cls, product_id, date):
+        """
+        recompute one (NspProduct, date) row. call inside the transaction that inserted the Price
+        """
+        rows = list(cls.aggregate(Price.objects.filter(product__product_id=product_id, date=date)))
+        if not rows:
+            cls.objects.filter(product_id=product_id, date=date).delete()
+            return
+        row = rows[0]
+        cls.objects.update_or_create(product_id=product_id, date=date, defaults={
+            'value': row['low'], 'high': row['high'], 'mean': row['mean'], 'count': row['count']})
+
+    @classmethod
+    def refresh_many(cls, pairs):
+        """
+        recompute the rows of several (NspProduct id, date) pairs with one aggregate query
+        """
+        if not pairs:
+            return
+        ids = set(product_id for product_id, date in pairs)
+        dates = set(date for product_id, date in pairs)
+        # ids x dates 조합을 모두 지우고 다시 계산하므로 가격이 있는 조합은 빠짐없이 다시 만들어짐
+        rows = [cls(product_id=row['product__product_id'], date=row['date'], value=row['low'],
+                    high=row['high'], mean=row['mean'], count=row['count'])
+                for row in cls.aggregate(Price.objects.filter(product__product_id__in=ids, date__in=dates))]
+        with transaction.atomic():
+            cls.objects.filter(product_id__in=ids, date__in=dates).delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+
+    @classmethod
+    def rebuild(cls, products=None):
+        """
+        rebuild the rollup from every Price row
+        :param products: NspProduct queryset/list (default: all)
+        :return: number of rows written
+        """
+        prices = Price.objects.all()
+        daily = cls.objects.all()
+        if products is not None:
+            prices = prices.filter(product__product__in=products)
+            daily = daily.filter(product__in=products)
+        rows = [cls(product_id=row['product__product_id'], date=row['date'], value=row['low'],
+                    high=row['high'], mean=row['mean'], count=row['count']) for row in cls.aggregate(prices)]
+        with transaction.atomic():
+            daily.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+class Notification(models.Model):
+    # 발송 대기 중인 이메일/문자(outbox)
+    EMAIL = 1
+    SMS = 2
+    PENDING = 0
+    SENT = 1
+    DEAD = 2    # 재시도 횟수를 모두 쓴 것
+    SENDING = 3 # worker가 가져가서 보내는 중 (next_try까지 lease)
+    channel = models.IntegerField()
+    to = models.CharField(max_length=254)
+    title = models.CharField(max_length=200, default="")
+    content = models.TextField()
+    status = models.IntegerField(default=PENDING)
+    attempts = models.IntegerField(default=0)
+    next_try = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=400, default="")
+    claim = models.CharField(max_length=32, default="", db_index=True)   # 가져간 worker의 claim 토큰
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_try'], name='notification_due_idx')]
+
+    def __str__(self):
+        return self.to+' '+self.title
+
+
 class PhoneKey(models.Model):
     value = models.IntegerField()
     user = models.ForeignKey("HUser", related_name='phonekey',on_delete=models.CASCADE)
@@ -270,6 +326,75 @@ class Report(models.Model):
 class WordCloudImg(models.Model):
     img = models.ImageField(upload_to='img')
     product = models.OneToOneField("NspProduct", related_name='cloud', on_delete=models.CASCADE)
+    signature = models.CharField(max_length=40, default='')   # 이 이미지를 그린 상위 단어 빈도의 해시
     
     def __str__(self):
-        return self.product.name
\ No newline at end of file
+        return self.product.name
+
+class NounCount(models.Model):
+    # 상품별 뉴스 제목 명사 빈도. 뉴스가 저장될 때 새 제목만큼 더하고, 워드 클라우드는 여기서 바로 만듦
+    product = models.ForeignKey("NspProduct", related_name='nouns', on_delete=models.CASCADE)
+    noun = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'noun')
+
+    def __str__(self):
+        return str(self.product)+' - '+self.noun
+
+    @classmethod
+    def add(cls, counts):
+        """
+        add counts. call inside the transaction that inserted the News
+        :param counts: dict of (product_id, noun) -> count
+        """
+        if not counts:
+            return
+        product_ids = set(pid for pid, noun in counts)
+        nouns = set(noun for pid, noun in counts)
+        update = []
+        for row in cls.objects.select_for_update().filter(product_id__in=product_ids, noun__in=nouns):
+            key = (row.product_id, row.noun)
+            if key in counts:
+                row.count += counts[key]
+                update.append(row)
+        found = set((row.product_id, row.noun) for row in update)
+        cls.objects.bulk_update(update, ['count'], batch_size=1000)
+        cls.objects.bulk_create([cls(product_id=pid, noun=noun, count=n) for (pid, noun), n in counts.items()
+                                 if (pid, noun) not in found], batch_size=1000)
+
+    @classmethod
+    def top(cls, product_ids, num_words=30):
+        """
+        :return: dict of product_id -> {noun: count} of its num_words most common nouns
+        """
+        ret = {pid: {} for pid in product_ids}
+        rows = cls.objects.filter(product_id__in=product_ids).order_by('product_id', '-count', 'noun')
+        for pid, noun, count in rows.values_list('product_id', 'noun', 'count').iterator():
+            if len(ret[pid]) < num_words:
+                ret[pid][noun] = count
+        return ret
+
+    @classmethod
+    def rebuild(cls, products=None):
+        """
+        recount every News title (komoran)
+        :param products: NspProduct queryset/list (default: all)
+        :return: number of rows written
+        """
+        from Displayer.news.cloud import noun_counts
+        news = News.objects.all()
+        counts = cls.objects.all()
+        if products is not None:
+            news = news.filter(product__in=products)
+            counts = counts.filter(product__in=products)
+        titles = {}
+        for pid, title in news.values_list('product_id', 'title').iterator():
+            titles.setdefault(pid, []).append(title)
+        rows = [cls(product_id=pid, noun=noun, count=n)
+                for pid, title_list in titles.items() for noun, n in noun_counts(title_list).items()]
+        with transaction.atomic():
+            counts.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
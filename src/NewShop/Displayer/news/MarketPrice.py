@@ -3,6 +3,9 @@ from bs4 import BeautifulSoup
 import re
 import copy
 from urllib import parse
+from Displayer.news.scheduler import scheduler
+
+INTERACTIVE_TIMEOUT = 3
 
 class MarketPrice(object):
     def __init__(self):
@@ -15,7 +18,26 @@ class MarketPrice(object):
         word = '+'.join(word)
         return self.market + word
 
-    def get_data(self, word, num_of_item=5):
+    def is_empty(self, html):
+        # 가격 태그가 하나도 없으면 차단되었거나 빈 결과 페이지로 봄
+        return self.market_info['price'][1]['class'] not in html
+
+    def request(self, url, interactive=False):
+        """
+        :param interactive: request made while a user waits for the page (views). it skips the crawl scheduler
+            (rate limit, backoff, retries) and gives up after INTERACTIVE_TIMEOUT seconds
+        """
+        if interactive:
+            try:
+                return requests.get(url, headers=self.headers, timeout=INTERACTIVE_TIMEOUT).text
+            except requests.RequestException:
+                return ''
+        req = scheduler.get(url, is_empty=self.is_empty, headers=self.headers)
+        if req is None:
+            return ''
+        return req.text
+
+    def get_data(self, word, num_of_item=5, interactive=False):
         """
         get market price data from open market.
         :param word: search word
@@ -34,10 +56,9 @@ class Coupang(MarketPrice):
         self.market_info = {'name': ('div', {'class': 'name'}), 'price': ('strong', {'class': 'price-value'}),
                             'link': ('a', {'class': 'search-product-link'})}
 
-    def get_data(self, word, num_of_item=5):
+    def get_data(self, word, num_of_item=5, interactive=False):
         url = self.make_price_url(word)
-        req = requests.get(url, headers=self.headers)
-        html = req.text
+        html = self.request(url, interactive)
         soup = BeautifulSoup(html, 'html.parser')
         ret = []
         list_price = soup.find_all(self.market_info['price'][0], self.market_info['price'][1])
@@ -63,10 +84,9 @@ class Gmarket(MarketPrice):
         self.market_info = {'name': ('span', {'class': 'text__item'}), 'price': ('strong', {'class': 'text text__value'}),
                             'link': ('a', {'class': 'link__item'})}
 
-    def get_data(self, word, num_of_item=5):
+    def get_data(self, word, num_of_item=5, interactive=False):
         url = self.make_price_url(word)
-        req = requests.get(url, headers=self.headers)
-        html = req.text
+        html = self.request(url, interactive)
         soup = BeautifulSoup(html, 'html.parser')
         ret = []
         list_price = soup.find_all(self.market_info['price'][0], self.market_info['price'][1])
@@ -92,10 +112,9 @@ class Wemakeprice(MarketPrice):
         self.market_info={'name': ('img', {'class': "motion-fade"}), 'price': ('em', {'class': 'num'}),
                           'link': ('div', {'class': 'search_box_imagedeal type4'})}
 
-    def get_data(self, word, num_of_item=5):
+    def get_data(self, word, num_of_item=5, interactive=False):
         url = self.make_price_url(word)
-        req = requests.get(url, headers=self.headers)
-        html = req.text
+        html = self.request(url, interactive)
         ret = []
         soup = BeautifulSoup(html, 'html.parser')
         list_price = soup.find_all(self.market_info['price'][0], self.market_info['price'][1])
@@ -123,10 +142,9 @@ class G9(MarketPrice):
         self.market_info={'name': ('span', {'class': 'itemcard__title__name'}), 'price': ('strong', {'class': 'format-price__value'}),
                           'link': ('a', {'class': 'itemcard__link'}), 'brand': ('span', {'class': 'itemcard__title__brand'})}
 
-    def get_data(self, word, num_of_item=5):
+    def get_data(self, word, num_of_item=5, interactive=False):
         url = self.make_price_url(word)
-        req = requests.get(url, headers=self.headers)
-        html = req.text
+        html = self.request(url, interactive)
         soup = BeautifulSoup(html, 'html.parser')
         ret = []
         list_price = soup.find_all(self.market_info['price'][0], self.market_info['price'][1])
@@ -154,10 +172,9 @@ class Auction(MarketPrice):
         self.market_info = {'name': ('span', {'class': 'text--title'}), 'price': ('strong', {'class':'text--price_seller'}),
                             'link': ('a', {'class': 'link--itemcard'})}
 
-    def get_data(self, word, num_of_item=5):
+    def get_data(self, word, num_of_item=5, interactive=False):
         url = self.make_price_url(word)
-        req = requests.get(url, headers=self.headers)
-        html = req.text
+        html = self.request(url, interactive)
         soup = BeautifulSoup(html, 'html.parser')
         ret = []
         list_price = soup.find_all(self.market_info['price'][0], self.market_info['price'][1])
@@ -0,0 +1,75 @@
+import io
+import json
+import hashlib
+import itertools
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from wordcloud import WordCloud
+
+# 워드 클라우드 그리기. 빈도수에서 WordCloud.to_image()로 바로 PNG를 만들고 pyplot은 쓰지 않음.
+# 이 파일의 함수들은 Django 없이 다른 프로세스에서 실행될 수 있게 함. 명사 빈도는 NounCount 테이블에서 가져옴
+
+FONT_PATH = 'Displayer/news/NanumBarunGothic.ttf'
+
+_renderer = None
+
+
+def get_renderer():
+    # 프로세스마다 WordCloud(폰트 포함)를 한 번만 만들어 다시 사용
+    global _renderer
+    if _renderer is None:
+        _renderer = WordCloud(background_color='white', width=800, height=600, font_path=FONT_PATH, colormap='gist_gray')
+    return _renderer
+
+
+def noun_counts(titles):
+    """
+    :param titles: news titles
+    :return: Counter of nouns (2+ letters) -> count
+    """
+    from Displayer.news.TextRank import komoran_tokenizer
+    tokens = itertools.chain.from_iterable(komoran_tokenizer(title) or [] for title in titles)
+    return collections.Counter(word for word, tag in tokens if 'NN' in tag and len(word) > 1)
+
+
+def signature(words):
+    # 상위 단어 빈도가 같으면 같은 그림이므로 다시 그리지 않기 위한 값
+    return hashlib.sha1(json.dumps(sorted(words.items()), ensure_ascii=False).encode()).hexdigest()
+
+
+def render_png(words):
+    """
+    :param words: dict of word -> frequency
+    :return: PNG bytes, or None when there is no word
+    """
+    if not words:
+        return None
+    image = get_renderer().generate_from_frequencies(words).to_image()
+    buffer = io.BytesIO()
+    image.save(buffer, format='png')
+    return buffer.getvalue()
+
+
+class CloudPool(object):
+    def __init__(self, workers=None):
+        """
+        render word clouds in worker processes.
+        workers are spawned (not forked) because the parent may already run the Komoran JVM.
+        """
+        self.pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def render(self, jobs):
+        """
+        :param jobs: iterable of (key, dict of word -> frequency)
+        :return: iterator of (key, PNG bytes or None), in the same order
+        """
+        keys = []
+        words = []
+        for key, word_dict in jobs:
+            keys.append(key)
+            words.append(word_dict)
+        return zip(keys, self.pool.map(render_png, words, chunksize=4))
+
+    def shutdown(self):
+        self.pool.shutdown()
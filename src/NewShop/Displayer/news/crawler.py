@@ -4,7 +4,12 @@ import re
 from datetime import date as DATE
 from datetime import datetime
 from Displayer.news.MarketPrice import markets
-from Displayer.models import Price, SpProduct
+from Displayer.news.scheduler import scheduler
+from Displayer.news.parser import ParsePool, extract_links, extract_title_date, extract_sentences
+from Displayer.models import Price, SpProduct, DailyPrice
+from Displayer import alarms
+from Displayer.caching import bump_products
+from django.db import transaction
 
 def make_news_url(search_word: str, start_date: str, end_date: str, length: int):
     """
@@ -31,6 +36,27 @@ def make_news_url(search_word: str, start_date: str, end_date: str, length: int)
 class Crawler(object):
     def __init__(self, verbose=0):
         self.verbose = verbose
+        self.pool = None
+
+    def close(self):
+        # get_news_articles가 만든 다운로드 스레드/파싱 프로세스를 정리함
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fetch_html(self, url, is_empty=None):
+        req = scheduler.get(url, is_empty=is_empty)
+        if self.verbose:
+            print("Crawling url is ", url)
+        if req is None:
+            return ''
+        return req.text
 
     def get_news_link(self, url):
         """
@@ -38,36 +64,31 @@ class Crawler(object):
         :param url:
         :return: html string
         """
-        req = requests.get(url)
-        if self.verbose:
-            print("Crawling url is ", url)
+        html = self.fetch_html(url, is_empty=lambda html: 'type01' not in html)
+        if not html:
+            return []
+        return extract_links(html)
 
-        html = req.text
-        soup = BeautifulSoup(html, 'html.parser')
-        ret_str = soup.select('ul.type01 > li > dl > dd > a')
-        news_list = []
-        for get_str in ret_str:
-            news_list.append(get_str['href'])
-        return news_list
+    def iter_news_pages(self, urls, frontier):
+        """
+        yield unseen news links page by page
+        :param urls: search result pages made by make_news_url
+        :param frontier: UrlFrontier of the product
+        :return: generator of news link list
+        """
+        for url in urls:
+            news = self.get_news_link(url)
+            fresh = frontier.filter(news)
+            # 한 페이지가 모두 이미 수집된 기사라면 뒤쪽 페이지는 요청하지 않음
+            if not fresh:
+                break
+            yield fresh
 
     def get_news_title_date(self, url):
-        req = requests.get(url)
-        if self.verbose:
-            print("Crawling url is ", url)
-
-        html = req.text
-        soup = BeautifulSoup(html, 'html.parser')
-
-        try:
-            title = str(soup.select('#articleTitle'))
-            date = str(soup.find_all('span', {'class': 't11'})[0])
-        except:
+        html = self.fetch_html(url)
+        if not html:
             return '', ''
-
-        title = str(re.sub('<[^(<|>)]*>', '', title))
-        date = str(re.sub('<[^(<|>)]*>', '', date))
-
-        return title, date
+        return extract_title_date(html)
 
     def get_news_contents(self, url):
         """
@@ -75,41 +96,29 @@ class Crawler(object):
         :param url: news site url
         :return: news contents split by sentence
         """
-        req = requests.get(url)
-        if self.verbose:
-            print("Crawling url is ", url)
-
-        html = req.text
-        soup = BeautifulSoup(html, 'html.parser')
-        try:
-            ret_str = str(soup.select('#articleBodyContents')[0])
-        except:
+        html = self.fetch_html(url)
+        if not html:
             return ''
+        return extract_sentences(html)
 
-        cutting = re.compile('<[^(<|>)]*>')
-        cutting_list = cutting.findall(ret_str)
-        for cutting_str in cutting_list:
-            ret_str = ret_str.replace(cutting_str, '', 1)
-        ret_str = ret_str.replace('// flash 오류를 우회하기 위한 함수 추가', '')
-        ret_str = ret_str.replace('function _flash_removeCallback() {}', '')
-        ret_str = ret_str.replace('\n', '', 100)
-        ret_str = ret_str.replace('\t', '', 100)
-        ret_str = ret_str.split('.')
-        ret = []
-        for sentence in ret_str:
-            if '[' in sentence or ']' in sentence or '▶' in sentence or 'Copyright' in sentence or '@' in sentence:
-                continue
-            if sentence == 'co' or sentence =='kr' or sentence =='com':
-                continue
-            if len(sentence) == 0:
-                continue
-            ret.append(sentence)
+    def get_news_articles(self, urls):
+        """
+        download news pages concurrently and parse them on the process pool
+        :param urls: news site urls
+        :return: dict of url -> (title, date, sentences), None when the download or the parsing failed
+        """
+        if self.pool is None:
+            self.pool = ParsePool(self.fetch_html)
+        ret = self.pool.get_articles(urls)
+        if self.verbose:
+            print(self.pool.report())
         return ret
 
-    def get_market_real_time(self, product_name, num_of_item=15):
+    def get_market_real_time(self, product_name, num_of_item=15, interactive=False):
         """
         crawling the market price for given keyword.
         :param key_word: search word
+        :param interactive: called from a view. short timeout, no scheduler retries/backoff
         :return: list of dictionary.
                 name: name of product in market
                 price: price of product in market
@@ -118,7 +127,7 @@ class Crawler(object):
         ret = []
         key = product_name.lower().split()
         for market in markets:
-            get_data = market.get_data(product_name, 20)
+            get_data = market.get_data(product_name, 20, interactive)
             for element in get_data:
                 check = 1
                 for keyword in key:
@@ -130,15 +139,33 @@ class Crawler(object):
         ret = sorted(ret, key=lambda dict: dict['price'])
         return ret[:num_of_item]
 
-    def update_market_price(self, product_name):
-        data = self.get_market_real_time(product_name, 1)
-        product = SpProduct.objects.filter(name=product_name)[0]
+    def update_market_price(self, product, ingestor=None):
+        """
+        store today's lowest market price of a SpProduct
+        :param product: SpProduct instance or name
+        :param ingestor: Ingestor to buffer the row in (default: write immediately)
+        :return: False when no market returned a price
+        """
+        if isinstance(product, str):
+            product = SpProduct.objects.filter(name=product)[0]
+        data = self.get_market_real_time(product.name, 1)
+        if not data:
+            # 모든 마켓에서 결과를 얻지 못함. 가짜 최저가를 저장하지 않고 실패를 알림
+            return False
         # SpProduct 하나당 가장 낮은 가격 하나만 저장됨
         low = 999999999999
         for data_row in data:            
             if data_row['price']<low:
                 low=data_row['price']
-        Price.objects.create(product=product, value=low, date=DATE.today())
+        if ingestor is not None:
+            ingestor.add_price(product, low, DATE.today())
+            return True
+        with transaction.atomic():
+            price, created = Price.objects.get_or_create(product=product, date=DATE.today(), defaults={'value': low})
+            DailyPrice.refresh(product.product_id, price.date)
+            transaction.on_commit(lambda: alarms.price_inserted([product.id]))
+            transaction.on_commit(lambda: bump_products([product.id, product.product_id]))
+        return True
 
 
 crawler = Crawler()
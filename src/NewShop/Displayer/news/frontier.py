@@ -0,0 +1,45 @@
+import threading
+from Displayer.models import News, SeenUrl
+
+
+class UrlFrontier(object):
+    def __init__(self, product):
+        """
+        set of article urls already collected for one NspProduct
+        :param product: NspProduct instance
+        """
+        self.product = product
+        self.seen = set(SeenUrl.objects.filter(product=product).values_list('url', flat=True))
+        # SeenUrl 테이블이 생기기 전에 저장된 뉴스도 수집된 것으로 봄
+        self.seen.update(News.objects.filter(product=product).values_list('url', flat=True))
+        self.lock = threading.Lock()
+        self.pending = []
+
+    def __contains__(self, url):
+        return url in self.seen
+
+    def filter(self, urls):
+        """
+        drop urls that were already collected (or repeated in the list)
+        :param urls: list of article urls
+        :return: list of unseen urls, order preserved
+        """
+        ret = []
+        for url in urls:
+            if url not in self.seen and url not in ret:
+                ret.append(url)
+        return ret
+
+    def add(self, url):
+        with self.lock:
+            if url in self.seen:
+                return
+            self.seen.add(url)
+            self.pending.append(SeenUrl(product=self.product, url=url))
+
+    def flush(self):
+        # Ingestor.flush와 같이 목록을 잠금 안에서 바꿔치기하고 저장은 잠금 밖에서 함
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if pending:
+            SeenUrl.objects.bulk_create(pending, ignore_conflicts=True)
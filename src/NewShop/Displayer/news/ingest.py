@@ -0,0 +1,133 @@
+import threading
+import collections
+from django.db import transaction
+from Displayer.models import Price, News, DailyPrice, NounCount
+from Displayer import alarms
+from Displayer.caching import bump, bump_products, NEWS_KEY
+from Displayer.news.cloud import noun_counts
+
+
+class Ingestor(object):
+    def __init__(self, batch_size=500, send_alarms=True):
+        """
+        buffer crawled Price/News rows and write them with bulk_create in one transaction per batch.
+        rows that conflict with the natural key (Price: product+date, News: url) are ignored.
+        :param batch_size: a buffer is flushed automatically when it reaches this size
+        :param send_alarms: evaluate alarms of the touched products after each commit
+        """
+        self.batch_size = batch_size
+        self.send_alarms = send_alarms
+        self.lock = threading.Lock()
+        # flush는 저장까지 한 번에 하나씩. 자동 flush 도중에 부른 flush(예: 체크포인트 전)는 그 저장이 커밋될 때까지 기다림
+        self.flush_lock = threading.Lock()
+        self.prices = []
+        self.news = []
+        self.frontiers = []
+
+    def add_price(self, product, value, date):
+        """
+        :param product: SpProduct instance
+        """
+        with self.lock:
+            self.prices.append(Price(product=product, value=value, date=date))
+            full = len(self.prices) >= self.batch_size
+        if full:
+            self.flush()
+
+    def add_news(self, frontier=None, **fields):
+        """
+        :param frontier: UrlFrontier of the product. the url is recorded as collected in the same flush
+            (transaction) that saves the news, so an article that never reaches here is crawled again next time
+        """
+        with self.lock:
+            self.news.append(News(**fields))
+            if frontier is not None:
+                self._seen(frontier, fields['url'])
+            full = len(self.news) >= self.batch_size
+        if full:
+            self.flush()
+
+    def add_seen(self, frontier, url):
+        # 본문이 없는 기사처럼 저장할 뉴스는 없지만 다시 받아올 필요도 없는 url. 다음 flush 때 기록됨
+        with self.lock:
+            self._seen(frontier, url)
+
+    def _seen(self, frontier, url):
+        frontier.add(url)
+        if frontier not in self.frontiers:
+            self.frontiers.append(frontier)
+
+    def _new_prices(self, prices):
+        # 이미 저장된 (상품, 날짜)와 묶음 안의 중복을 빼고 실제로 새로 들어갈 가격만 남김
+        existing = set(Price.objects.filter(product_id__in=set(p.product_id for p in prices), date__in=set(p.date for p in prices))
+                       .values_list('product_id', 'date'))
+        ret = []
+        for p in prices:
+            key = (p.product_id, p.date)
+            if key not in existing:
+                existing.add(key)
+                ret.append(p)
+        return ret
+
+    def _new_news(self, news):
+        # 제목/url 중복 검사를 한 묶음에 쿼리 두 번으로 처리
+        titles = set(News.objects.filter(title__in=[n.title for n in news]).values_list('title', flat=True))
+        urls = set(News.objects.filter(url__in=[n.url for n in news]).values_list('url', flat=True))
+        ret = []
+        for n in news:
+            if n.title not in titles and n.url not in urls:
+                titles.add(n.title)
+                urls.add(n.url)
+                ret.append(n)
+        return ret
+
+    def _noun_counts(self, news):
+        # 새 뉴스 제목의 명사 빈도. 워드 클라우드용 NounCount에 더함
+        titles = collections.defaultdict(list)
+        for n in news:
+            titles[n.product_id].append(n.title)
+        counts = {}
+        for product_id, title_list in titles.items():
+            for noun, count in noun_counts(title_list).items():
+                counts[(product_id, noun)] = count
+        return counts
+
+    def flush(self):
+        """
+        :return: (prices, news) newly written in this flush (rows that already existed are not included)
+        """
+        with self.flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self.lock:
+            prices, self.prices = self.prices, []
+            news, self.news = self.news, []
+            frontiers = list(self.frontiers)
+        # bulk_create(ignore_conflicts=True)는 건너뛴 행도 그대로 돌려주므로, 중복은 저장 전에 걸러 냄.
+        # 형태소 분석은 느리므로 트랜잭션(잠금)을 잡기 전에 끝냄
+        if news:
+            news = self._new_news(news)
+        counts = self._noun_counts(news)
+        with transaction.atomic():
+            if prices:
+                prices = self._new_prices(prices)
+            if prices:
+                Price.objects.bulk_create(prices, batch_size=self.batch_size, ignore_conflicts=True)
+                DailyPrice.refresh_many(set((p.product.product_id, p.date) for p in prices))
+                touched = [p.product_id for p in prices] + [p.product.product_id for p in prices]
+                transaction.on_commit(lambda: bump_products(touched))
+            if news:
+                News.objects.bulk_create(news, batch_size=self.batch_size, ignore_conflicts=True)
+                NounCount.add(counts)
+                # 홈 피드와 상품 페이지 캐시 무효화
+                transaction.on_commit(lambda: bump(NEWS_KEY))
+                transaction.on_commit(lambda: bump_products(n.product_id for n in news))
+            for frontier in frontiers:
+                frontier.flush()
+            if self.send_alarms:
+                # 새 가격/뉴스가 생긴 상품의 알림만 커밋 후에 확인
+                price_ids = set(p.product_id for p in prices)
+                transaction.on_commit(lambda: alarms.price_inserted(price_ids))
+                transaction.on_commit(lambda: alarms.news_inserted(news))
+        return prices, news
@@ -5,9 +5,7 @@ import sys
 import collections
 import json
 import random
-import io
 import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime
 
 # Pytorch: 파이토치는 GPU 리소스를 사용할 수 있는 머신러닝 오픈소스 라이브러리이다.
@@ -21,15 +19,17 @@ from torchtext.data import TabularDataset, Iterator
 
 # KoNLPy: 코엔엘파이는 한국어 정보처리를 위한 파이썬 패키지이다. 여기서는 코모란 토크나이저를 사용한다.
 from konlpy.tag import Komoran
-# WordCloud: 워드클라우드를 만들기 위한 라이브러리이다.
-from wordcloud import WordCloud
 
 from django.core.files.base import ContentFile
-from django.core.files.uploadedfile import InMemoryUploadedFile
-from NewShop.settings import MEDIA_ROOT
 
-from Displayer.models import News, NspProduct, SpProduct, WordCloudImg
+from Displayer.models import News, NspProduct, SpProduct, WordCloudImg, NounCount
 from Displayer.news.crawler import make_news_url, Crawler
+from Displayer.news.frontier import UrlFrontier
+from Displayer.news.store import get_store
+from Displayer.news.ingest import Ingestor
+from Displayer.caching import bump_products
+from Displayer.news.cloud import CloudPool, signature
+from Displayer.news.pipeline import Pipeline
 from Displayer.news.TextRank import keysentence_summarizer, komoran_tokenizer
 
 
@@ -261,119 +261,175 @@ def train_model():
             best_acc = test_log['test']['accuracy']
     print(f"### Best accuracy: {best_acc} ###")
 
+# 저장된 모델을 불러오는 함수이다.
+def load_model(m_path):
+    checkpoint = torch.load(m_path, map_location=device)
+    model = TextSentiment(checkpoint['vocab_size'], checkpoint['embed_dim'], checkpoint['n_classes']).to(device)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.to(device)
+    model.eval()
+    return model, checkpoint['vocab']
+
+# 요약문 여러 개를 한 번에 분류하는 함수이다. 각 요약문의 첫 문장을 모델의 입력으로 사용한다.
+def classify(model, vocab, key_sentences_list):
+    """
+    :param key_sentences_list: list of key sentence lists (output of keysentence_summarizer)
+    :return: list of predicted subj (0: price, 1: new product, 2: promotion, 3: industry)
+    """
+    ids = []
+    offsets = []
+    for key_sentences_ in key_sentences_list:
+        offsets.append(len(ids))
+        if key_sentences_:
+            ids += [vocab[token] for token in komoran.morphs(key_sentences_[0])]
+    text = torch.tensor(ids, dtype=torch.long).to(device)
+    offsets = torch.tensor(offsets, dtype=torch.long).to(device)
+    with torch.no_grad():
+        outputs = model(text, offsets)
+    _, predicted = outputs.max(1)
+    return predicted.tolist()
+
 # 실제 데이터에서 학습된 모델을 통해 아웃풋(output)을 얻어내는 함수이다.
-def test_model(query, date_range, length, m_path):
+def test_model(query, date_range, length, m_path, ingestor=None, batch_size=32, maxsize=16, loaded=None, crawler=None):
     """ Usage
         # Arguments:
         #     1) list (Query sentence) (*** Should be product name ***)
         #     2) list (Range of searching news)
         #     3) int (Maximum length of searching news)
         #     4) string (Path to TextSentiment model) (*** Do not touch ***)
+        #     5) Ingestor (optional. news rows are buffered in it; flushed here when not given)
+        #     loaded: (model, vocab) from load_model, crawler: Crawler (optional. to reuse them over several calls;
+        #     a given crawler is not closed here)
+        crawl -> summarize -> classify (batch_size articles at once) -> persist run concurrently,
+        connected by queues of at most maxsize articles
     (Example)
     test_model(['ssd'], ['20200601', '20200608'], 9, 'Displayer/news/best_model.pth'))
     """
     # 저장된 모델을 불러온다.
-    checkpoint = torch.load(m_path, map_location=device)
-    model = TextSentiment(checkpoint['vocab_size'], checkpoint['embed_dim'], checkpoint['n_classes']).to(device)
-    model.load_state_dict(checkpoint['model_state_dict'])
-    model.to(device)
-    model.eval()
+    model, vocab = loaded if loaded is not None else load_model(m_path)
     # Crawling & NLP start & Update database
     # 크롤링을 통해 얻어진 뉴스 데이터를 가공 후 데이터베이스에 저장하는 과정이다.
-    crawler = Crawler()
-    for i, q in enumerate(query):
-        url = make_news_url(q, date_range[0], date_range[1], length)
-        for url_ in url:
-            news = crawler.get_news_link(url_)
-            for n_url in news:
-                # 크롤링을 통해 뉴스 데이터를 가져온다.
-                news_contents_ = crawler.get_news_contents(n_url)
-                if not news_contents_:
-                    pass
-                elif not news_contents_ == '':
-                    print("### News summary")
-                    # 뉴스 데이터를 TexTrank의 keysentence summarizer 기법을 활용해 T줄 만큼 요약한다.
-                    key_sentences_ = keysentence_summarizer(news_contents_, d_f=0.85, epochs=30, threshold=0.001, T=5)
-                    print(key_sentences_)
-                    tokens = [komoran.morphs(sent) for sent in key_sentences_]
-                    vocab = checkpoint['vocab']
-                    text = torch.tensor([vocab[token] for token in tokens[0]]).to(device)
-                    offsets = torch.tensor([0]).to(device)
-                    outputs = model(text, offsets)
-                    # 모델에 얻어진 뉴스 데이터를 넣어 결과(output)을 반환한다.
-                    # '0'이라면 가격과 관련된 뉴스, '1'이라면 신 제품에 관련된 뉴스,
-                    #'2'라면 프로모션과 관련된 뉴스, '3'이라면 업계 동향과 관련된 뉴스이다.
-                    _, predicted = outputs.max(1)
-                    print(f"### Predict: {predicted.item()} \t(0: price, 1: new product, 2: promotion, 3: industry)")
-
-                    title_, date_ = crawler.get_news_title_date(n_url)
-                    date_arr = date_.split('.')
-                    date_ = datetime(int(date_arr[0]), int(date_arr[1]), int(date_arr[2]))
-                    title_ = title_[1:-1]
-                    # 중복을 검사하는 과정이다.
-                    if News.objects.filter(title=title_).count() == 0:
-                        product_ = NspProduct.objects.filter(name=q)[0]
-                        key_sentences_string = ''
-                        for i in key_sentences_:
-                            key_sentences_string += i
-                            key_sentences_string += " "
-                        # 크롤링을 통해 얻어진 뉴스 날짜, 뉴스 제목, 뉴스 url과 모델을 통해 가공된 분류(subj), 요약문단(piece),
-                        # 그리고 관련된 상품(쿼리, query)의 정보를 데이터베이스에 저장한다.
-                        key_sentences_string = key_sentences_string[:40]+'...'
-                        News.objects.create(date=date_, title=title_, subj=predicted.item(), url=n_url, product=product_, piece=key_sentences_string)
+    own_crawler = crawler is None
+    if own_crawler:
+        crawler = Crawler()
+    store = get_store()
+    own_ingestor = ingestor is None
+    if own_ingestor:
+        ingestor = Ingestor()
+
+    def crawl():
+        for q in query:
+            product_ = NspProduct.objects.filter(name=q)[0]
+            # 이미 수집한 기사 url은 다시 받아오지 않는다.
+            frontier = UrlFrontier(product_)
+            url = make_news_url(q, date_range[0], date_range[1], length)
+            for links in crawler.iter_news_pages(url, frontier):
+                # 크롤링을 통해 한 페이지의 뉴스 데이터를 동시에 가져온다. (html 분석은 별도 프로세스에서 수행)
+                articles = crawler.get_news_articles(links)
+                for n_url in links:
+                    if articles[n_url] is None:
+                        # 다운로드/파싱에 실패한 기사는 기록하지 않고 다음 수집 때 다시 시도한다.
+                        continue
+                    title_, date_, news_contents_ = articles[n_url]
+                    if not news_contents_:
+                        # 본문이 없는 기사는 다시 받아와도 같으므로 수집한 것으로 기록만 한다.
+                        ingestor.add_seen(frontier, n_url)
+                        continue
+                    # 재분류나 데이터셋 생성 때 다시 크롤링하지 않도록 본문을 저장해 둔다.
+                    store.put(n_url, title_, date_, news_contents_)
+                    yield product_, frontier, n_url, title_, date_, news_contents_
+
+    def summarize(articles):
+        # 뉴스 데이터를 TexTrank의 keysentence summarizer 기법을 활용해 T줄 만큼 요약한다.
+        return [(product_, frontier, n_url, title_, date_, keysentence_summarizer(news_contents_, d_f=0.85, epochs=30, threshold=0.001, T=5))
+                for product_, frontier, n_url, title_, date_, news_contents_ in articles]
+
+    def predict(articles):
+        # 모델에 얻어진 뉴스 데이터를 넣어 결과(output)을 반환한다. 모인 기사들을 한 번에 분류한다.
+        # '0'이라면 가격과 관련된 뉴스, '1'이라면 신 제품에 관련된 뉴스,
+        #'2'라면 프로모션과 관련된 뉴스, '3'이라면 업계 동향과 관련된 뉴스이다.
+        predicted = classify(model, vocab, [article[5] for article in articles])
+        return [article + (subj,) for article, subj in zip(articles, predicted)]
+
+    def persist(articles):
+        # 날짜 형식이 틀린 기사 등으로 실패하면 Pipeline이 하나씩 다시 부르므로, 전부 만든 뒤에 Ingestor에 넣는다.
+        rows = []
+        for product_, frontier, n_url, title_, date_, key_sentences_, predicted in articles:
+            date_arr = date_.split('.')
+            date_ = datetime(int(date_arr[0]), int(date_arr[1]), int(date_arr[2]))
+            title_ = title_[1:-1]
+            key_sentences_string = ''
+            for i in key_sentences_:
+                key_sentences_string += i
+                key_sentences_string += " "
+            # 크롤링을 통해 얻어진 뉴스 날짜, 뉴스 제목, 뉴스 url과 모델을 통해 가공된 분류(subj), 요약문단(piece),
+            # 그리고 관련된 상품(쿼리, query)의 정보를 데이터베이스에 저장한다.
+            # 중복 검사(url, 제목)는 Ingestor가 모아서 저장할 때 한 번에 처리한다.
+            # 기사 url은 뉴스와 같이 저장될 때 수집 완료로 기록된다. (중간에 실패한 기사는 다음에 다시 수집)
+            key_sentences_string = key_sentences_string[:40]+'...'
+            rows.append((frontier, dict(date=date_, title=title_, subj=predicted, url=n_url, product=product_, piece=key_sentences_string)))
+        for frontier, fields in rows:
+            ingestor.add_news(frontier, **fields)
+
+    pipeline = Pipeline(maxsize)
+    pipeline.add('summarize', summarize).add('classify', predict, batch_size).add('persist', persist, batch_size)
+    # 일부 기사가 실패해도 나머지는 저장한 뒤 PipelineError를 다시 올린다. (regular.run은 이 상품을 체크포인트에 남기지 않음)
+    try:
+        pipeline.run(crawl(), 'crawl')
+    finally:
+        if own_crawler:
+            crawler.close()
+        if own_ingestor:
+            ingestor.flush()
+        pipeline.print_report()
 
 
 # 각 상품별로 관련된 뉴스 제목를 통해 워드 클라우드를 만드는 함수이다.
-def make_word_cloud(query, num_words=30):
+def make_word_cloud(query, num_words=30, workers=None, batch_size=64):
     """ Usage
         # Arguments:
         #     1) list (Query sentence) (*** Should be product name ***)
         #     2) int (# of words)
         Image will be saved in 'MEDIA_ROOT/img' folder (MEDIA_ROOT in settings.py)
+        word counts come from NounCount (updated when news is saved). products whose top words
+        did not change since the stored image are skipped; the rest are rendered in worker processes
     (Example)
     make_word_cloud(['ssd'], 30)
     """
-    for q in query:
-        product_id_ = NspProduct.objects.filter(name=q).values()[0]['id']
-        news_related = News.objects.filter(product=product_id_).values()
-        # 뉴스 제목들을 워드 클라우딩 한다.
-        titles = [news_related[i]['title'] for i in range(len(news_related))]
-        titles_tokens = sum([komoran_tokenizer(title_) for title_ in titles], [])
-        # Only nouns
-        titles_tokens = [i[0] for i in titles_tokens if 'NN' in i[1] and len(i[0]) > 1]
-        counter_ = collections.Counter(titles_tokens)
-        # num_words 만큼의 단어를 추출한다.
-        words_ = dict(counter_.most_common(num_words))
-
-        WordCloud_ = WordCloud(background_color='white', width=800, height=600, font_path='Displayer/news/NanumBarunGothic.ttf', colormap='gist_gray')
-        word_cloud = WordCloud_.generate_from_frequencies(words_)
-        plt.figure(figsize=(10, 8))
-        plt.axis('off')
-        plt.imshow(word_cloud)
-
-        # Django에 저장하기 위해 bytes로 변환        
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png')
-        img_ = buffer.getvalue()
-        buffer.close()
-        img_ = ContentFile(img_)
-        file_name = f'{q}.jpg'
-        media_root = os.path.join(MEDIA_ROOT, 'img')
-        # Exception handling
-        try:
-            if not os.path.exists(media_root):
-                os.makedirs(media_root)
-            if file_name in os.listdir(media_root):
-                os.remove(os.path.join(media_root, file_name))
-        except:
-            pass
-        img_ = InMemoryUploadedFile(img_, None, file_name, 'image/jpeg', img_.tell, None)
-        product_ = NspProduct.objects.filter(name=q)[0]
-        # Check redundancy
-        object_ = WordCloudImg.objects.filter(product=product_)
-        if len(object_) > 0:
-            wci = WordCloudImg.objects.get(product=product_)
-            wci.img = img_
-            wci.save()
-        else:
-            WordCloudImg(img=img_, product=product_).save()
+    products = list(NspProduct.objects.filter(name__in=query).select_related('cloud'))
+    pool = None
+    try:
+        for i in range(0, len(products), batch_size):
+            batch = {product_.id: product_ for product_ in products[i:i+batch_size]}
+            jobs = {}
+            for product_id_, words_ in NounCount.top(batch.keys(), num_words).items():
+                sig = signature(words_)
+                try:
+                    if batch[product_id_].cloud.signature == sig:
+                        continue
+                except WordCloudImg.DoesNotExist:
+                    pass
+                jobs[product_id_] = (words_, sig)
+            if not jobs:
+                continue
+            if pool is None:
+                pool = CloudPool(workers)
+            for product_id_, png in pool.render((pid, job[0]) for pid, job in jobs.items()):
+                if png is not None:
+                    save_word_cloud(batch[product_id_], png, jobs[product_id_][1])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def save_word_cloud(product_, png, sig=''):
+    # 예전 이미지 파일은 지우고 같은 이름으로 저장
+    try:
+        wci = product_.cloud
+        wci.img.delete(save=False)
+    except WordCloudImg.DoesNotExist:
+        wci = WordCloudImg(product=product_)
+    wci.signature = sig
+    wci.img.save(f'{product_.name}.png', ContentFile(png))
+    # 상품 페이지의 워드 클라우드 캐시 무효화
+    bump_products([product_.id])
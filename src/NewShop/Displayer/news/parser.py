@@ -0,0 +1,152 @@
+import re
+import time
+import traceback
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from bs4 import BeautifulSoup
+
+# 이 파일의 extract_* 함수들은 html 문자열만 받아 다른 프로세스에서도 실행될 수 있게 함
+
+TAG = re.compile('<[^(<|>)]*>')
+
+
+def extract_links(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return [a['href'] for a in soup.select('ul.type01 > li > dl > dd > a')]
+
+
+def extract_title_date(html, soup=None):
+    if soup is None:
+        soup = BeautifulSoup(html, 'html.parser')
+    try:
+        title = str(soup.select('#articleTitle'))
+        date = str(soup.find_all('span', {'class': 't11'})[0])
+    except:
+        return '', ''
+    return TAG.sub('', title), TAG.sub('', date)
+
+
+def extract_sentences(html, soup=None):
+    """
+    make usable data
+    :param html: news page html
+    :return: news contents split by sentence
+    """
+    if soup is None:
+        soup = BeautifulSoup(html, 'html.parser')
+    try:
+        ret_str = str(soup.select('#articleBodyContents')[0])
+    except:
+        return ''
+    # 태그마다 replace를 부르면 긴 기사에서 제곱 시간이 걸리므로 한 번에 지움
+    ret_str = TAG.sub('', ret_str)
+    ret_str = ret_str.replace('// flash 오류를 우회하기 위한 함수 추가', '')
+    ret_str = ret_str.replace('function _flash_removeCallback() {}', '')
+    ret_str = ret_str.replace('\n', '', 100)
+    ret_str = ret_str.replace('\t', '', 100)
+    ret = []
+    for sentence in ret_str.split('.'):
+        if '[' in sentence or ']' in sentence or '▶' in sentence or 'Copyright' in sentence or '@' in sentence:
+            continue
+        if sentence == 'co' or sentence == 'kr' or sentence == 'com':
+            continue
+        if len(sentence) == 0:
+            continue
+        ret.append(sentence)
+    return ret
+
+
+def extract_article(html):
+    """
+    :return: (title, date, sentences) of a news page, parsed once
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    title, date = extract_title_date(html, soup)
+    return title, date, extract_sentences(html, soup)
+
+
+def _timed(func, arg):
+    started = time.time()
+    ret = func(arg)
+    return ret, started, time.time()
+
+
+class StageStats(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.wait = 0.0
+        self.busy = 0.0
+        self.first = None
+        self.last = None
+
+    def add(self, submitted, started, finished):
+        with self.lock:
+            self.count += 1
+            # wait: 큐에서 작업자를 기다린 시간, busy: 실제 작업 시간
+            self.wait += started - submitted
+            self.busy += finished - started
+            self.first = submitted if self.first is None else min(self.first, submitted)
+            self.last = finished if self.last is None else max(self.last, finished)
+
+    def report(self):
+        with self.lock:
+            span = (self.last - self.first) if self.count else 0
+            return {
+                'count': self.count,
+                'avg_wait': self.wait / self.count if self.count else 0.0,
+                'avg_busy': self.busy / self.count if self.count else 0.0,
+                'throughput': self.count / span if span > 0 else float(self.count),
+            }
+
+
+class ParsePool(object):
+    def __init__(self, fetch, fetchers=8, parsers=None):
+        """
+        network fetches run on threads driven by asyncio, html extraction runs on a process pool.
+        only html goes to the worker processes and only (title, date, sentences) comes back.
+        :param fetch: callable(url) -> html string ('' on failure)
+        :param fetchers: number of concurrent downloads
+        :param parsers: number of parser processes (default: cpu count)
+        """
+        self.fetch = fetch
+        self.fetchers = ThreadPoolExecutor(fetchers)
+        # Komoran JVM이 이미 떠 있는 프로세스를 fork하면 안전하지 않으므로 spawn으로 띄움
+        self.parsers = ProcessPoolExecutor(parsers, mp_context=multiprocessing.get_context('spawn'))
+        self.stats = {'fetch': StageStats(), 'parse': StageStats()}
+
+    async def _article(self, loop, url):
+        submitted = time.time()
+        html, started, finished = await loop.run_in_executor(self.fetchers, _timed, self.fetch, url)
+        self.stats['fetch'].add(submitted, started, finished)
+        if not html:
+            return url, None
+        submitted = time.time()
+        try:
+            article, started, finished = await loop.run_in_executor(self.parsers, _timed, extract_article, html)
+        except Exception:
+            # 파싱 실패는 이 기사만 실패로 돌려줌 (다음 수집 때 다시 시도)
+            traceback.print_exc()
+            return url, None
+        self.stats['parse'].add(submitted, started, finished)
+        return url, article
+
+    async def _gather(self, urls):
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*[self._article(loop, url) for url in urls])
+
+    def get_articles(self, urls):
+        """
+        :param urls: news site urls
+        :return: dict of url -> (title, date, sentences), None when the download or the parsing failed
+        """
+        return dict(asyncio.run(self._gather(urls)))
+
+    def report(self):
+        return {stage: stats.report() for stage, stats in self.stats.items()}
+
+    def shutdown(self):
+        self.fetchers.shutdown()
+        self.parsers.shutdown()
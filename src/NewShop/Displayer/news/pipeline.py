@@ -0,0 +1,142 @@
+import time
+import queue
+import threading
+import traceback
+import collections
+from Displayer.news.parser import StageStats
+
+# 단계별 스레드를 크기가 정해진 큐로 이은 파이프라인.
+# 다음 단계가 느리면 큐가 차서 앞 단계가 기다리므로(backpressure) 메모리에 쌓이는 항목 수는 큐 크기로 제한됨
+
+_DONE = object()
+
+
+class PipelineError(Exception):
+    def __init__(self, message, failures=()):
+        """
+        :param failures: list of (stage name, item or None, exception)
+        """
+        super().__init__(message)
+        self.failures = list(failures)
+
+    def __reduce__(self):
+        # process pool에서 부모로 보낼 때는 메시지만 보냄 (항목은 pickle할 수 없을 수 있음)
+        return PipelineError, (str(self),)
+
+
+class Pipeline(object):
+    def __init__(self, maxsize=16):
+        """
+        :param maxsize: max number of items waiting between two stages
+        """
+        self.maxsize = maxsize
+        self.stages = []
+        self.stats = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.failures = []
+
+    def add(self, name, func, batch_size=1):
+        """
+        :param func: callable(list of items) -> list of items for the next stage (None for the last stage).
+            when it raises, the items of the batch are retried one by one, so it must be safe to call again
+            with items of a failed batch
+        :param batch_size: up to this many waiting items are handed to func at once
+        """
+        self.stages.append((name, func, batch_size))
+        self.stats[name] = StageStats()
+        return self
+
+    def _feed(self, name, source, out):
+        stats = self.stats[name]
+        try:
+            it = iter(source)
+            while True:
+                started = time.time()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                stats.add(started, started, time.time())
+                out.put((time.time(), item))
+        except Exception as e:
+            # 원본에서 실패하면 뒤의 항목은 더 받을 수 없으므로 거기서 멈춤
+            self._failed(name, None, e)
+        finally:
+            out.put(_DONE)
+
+    def _failed(self, name, item, exc):
+        traceback.print_exception(type(exc), exc, exc.__traceback__)
+        with self.lock:
+            self.failures.append((name, item, exc))
+
+    def _call(self, name, func, items):
+        # 묶음이 실패하면 하나씩 다시 해서 실패한 항목만 빼고 나머지는 다음 단계로 넘김
+        try:
+            return func(items) or []
+        except Exception as e:
+            if len(items) == 1:
+                self._failed(name, items[0], e)
+                return []
+        ret = []
+        for item in items:
+            ret.extend(self._call(name, func, [item]))
+        return ret
+
+    def _work(self, name, func, batch_size, inq, out):
+        stats = self.stats[name]
+        done = False
+        while not done:
+            batch = [inq.get()]
+            # 이미 기다리고 있는 항목은 batch_size까지 한 번에 처리
+            while len(batch) < batch_size and batch[-1] is not _DONE:
+                try:
+                    batch.append(inq.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is _DONE:
+                batch.pop()
+                done = True
+            if not batch:
+                continue
+            started = time.time()
+            ret = self._call(name, func, [item for submitted, item in batch])
+            finished = time.time()
+            for submitted, item in batch:
+                stats.add(submitted, started, finished)
+            if out is not None:
+                for item in ret:
+                    out.put((time.time(), item))
+        if out is not None:
+            out.put(_DONE)
+
+    def run(self, source, source_name='source'):
+        """
+        :param source: iterable feeding the first stage. it runs on its own thread
+        :raise PipelineError: after every stage is finished, when any item failed.
+            items that did not fail have gone through every stage
+        """
+        self.failures = []
+        self.stats.setdefault(source_name, StageStats())
+        self.stats.move_to_end(source_name, last=False)
+        queues = [queue.Queue(self.maxsize) for _ in self.stages]
+        threads = [threading.Thread(target=self._feed, args=(source_name, source, queues[0]))]
+        for i, (name, func, batch_size) in enumerate(self.stages):
+            out = queues[i+1] if i+1 < len(queues) else None
+            threads.append(threading.Thread(target=self._work, args=(name, func, batch_size, queues[i], out)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self.failures:
+            name, item, exc = self.failures[0]
+            raise PipelineError(f'{len(self.failures)} item(s) failed, first in {name}: {exc!r}', self.failures)
+        return self.report()
+
+    def report(self):
+        failed = collections.Counter(name for name, item, exc in self.failures)
+        return {name: dict(stats.report(), failed=failed[name]) for name, stats in self.stats.items()}
+
+    def print_report(self):
+        for name, stats in self.report().items():
+            print(f"{name}\tcount: {stats['count']}\tfailed: {stats['failed']}\tthroughput: {stats['throughput']:.2f}/s"
+                  f"\tavg wait: {stats['avg_wait']:.3f}s\tavg busy: {stats['avg_busy']:.3f}s")
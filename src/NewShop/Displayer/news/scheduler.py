@@ -0,0 +1,202 @@
+import time
+import threading
+import collections
+from urllib.parse import urlparse
+import requests
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity):
+        """
+        :param rate: tokens refilled per second
+        :param capacity: maximum burst size
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class DomainState(object):
+    def __init__(self, rate, burst):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_rate = rate
+        self.backoff = 0.0
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+        self.first = None
+        self.last = None
+
+    def wait(self):
+        with self.lock:
+            delay = self.blocked_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.bucket.take()
+
+    def record(self, key, elapsed, nbytes=0):
+        with self.lock:
+            now = time.monotonic()
+            if self.first is None:
+                self.first = now - elapsed
+            self.last = now
+            self.stats['requests'] += 1
+            self.stats[key] += 1
+            self.stats['elapsed'] += elapsed
+            self.stats['bytes'] += nbytes
+
+
+class Scheduler(object):
+    def __init__(self, rate=2.0, burst=4, max_retries=3, max_empty_retries=1,
+                 base_backoff=1.0, max_backoff=60.0, min_rate=0.2, timeout=10):
+        """
+        shared politeness control for every crawl request.
+        each domain has its own token bucket; throttling (429/5xx, connection error, empty page)
+        halves the domain rate and blocks it for an exponentially growing time,
+        successful requests slowly bring the rate back.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.max_empty_retries = max_empty_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.min_rate = min_rate
+        self.timeout = timeout
+        self.domains = {}
+        self.deferred = collections.deque()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def share(self, n):
+        """
+        split the rate budget among n processes crawling the same domains.
+        every process has its own scheduler, so each one gets 1/n of the rate and burst
+        """
+        with self.lock:
+            self.rate /= n
+            self.burst = max(1, self.burst / n)
+            self.min_rate /= n
+
+    def _state(self, url):
+        domain = urlparse(url).netloc
+        with self.lock:
+            if domain not in self.domains:
+                self.domains[domain] = DomainState(self.rate, self.burst)
+            return self.domains[domain]
+
+    def _session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _throttled(self, state, retry_after=None):
+        with state.lock:
+            state.backoff = min(self.max_backoff, max(self.base_backoff, state.backoff * 2))
+            delay = state.backoff
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            state.blocked_until = time.monotonic() + delay
+            state.bucket.rate = max(self.min_rate, state.bucket.rate / 2)
+
+    def _succeeded(self, state):
+        with state.lock:
+            state.backoff /= 2
+            state.bucket.rate = min(state.max_rate, state.bucket.rate + 0.1 * state.max_rate)
+
+    def get(self, url, is_empty=None, **kwargs):
+        """
+        GET with per-domain rate limit and adaptive backoff
+        :param url: request url
+        :param is_empty: callable(html) -> bool. True means the page looks like a block/empty result
+        :return: requests.Response, None when every retry failed
+        """
+        state = self._state(url)
+        kwargs.setdefault('timeout', self.timeout)
+        empty = 0
+        for attempt in range(self.max_retries + 1):
+            state.wait()
+            start = time.monotonic()
+            try:
+                res = self._session().get(url, **kwargs)
+            except requests.RequestException:
+                state.record('error', time.monotonic() - start)
+                self._throttled(state)
+                continue
+            elapsed = time.monotonic() - start
+            if res.status_code == 429 or res.status_code >= 500:
+                state.record('throttled', elapsed)
+                retry_after = res.headers.get('Retry-After')
+                self._throttled(state, float(retry_after) if retry_after and retry_after.isdigit() else None)
+                continue
+            if is_empty is not None and is_empty(res.text):
+                state.record('empty', elapsed)
+                if empty < self.max_empty_retries:
+                    empty += 1
+                    self._throttled(state)
+                    continue
+                # 정말로 결과가 없는 페이지일 수 있으므로 그대로 돌려줌
+                return res
+            state.record('ok', elapsed, len(res.content))
+            self._succeeded(state)
+            return res
+        with state.lock:
+            state.stats['gave_up'] += 1
+        return None
+
+    def defer(self, func, *args):
+        # 재시도 횟수를 다 쓴 작업은 큐에 넣어 두고, 다른 작업이 끝난 뒤 다시 시도함
+        self.deferred.append((func, args))
+
+    def run_deferred(self):
+        """
+        run deferred jobs once. a job returning False counts as failed and is not queued again.
+        :return: number of jobs that failed again
+        """
+        failed = 0
+        jobs = list(self.deferred)
+        self.deferred.clear()
+        for func, args in jobs:
+            if func(*args) is False:
+                failed += 1
+        return failed
+
+    def report(self):
+        """
+        :return: dict of domain -> success rate, throughput and counters
+        """
+        ret = {}
+        with self.lock:
+            domains = list(self.domains.items())
+        for domain, state in domains:
+            stats = dict(state.stats)
+            requests_ = stats.get('requests', 0)
+            ok = stats.get('ok', 0)
+            span = (state.last - state.first) if state.first is not None else 0
+            stats['success_rate'] = ok / requests_ if requests_ else 0.0
+            stats['throughput'] = ok / span if span > 0 else float(ok)
+            stats['rate'] = state.bucket.rate
+            ret[domain] = stats
+        return ret
+
+    def print_report(self):
+        for domain, stats in sorted(self.report().items()):
+            print(f"{domain}\trequests: {stats.get('requests', 0)}\tsuccess: {stats['success_rate']:.2%}"
+                  f"\tthroughput: {stats['throughput']:.2f}/s\trate: {stats['rate']:.2f}/s")
+
+
+scheduler = Scheduler()
@@ -0,0 +1,166 @@
+import os
+import json
+import zlib
+import hashlib
+import threading
+import contextlib
+from django.conf import settings
+try:
+    import fcntl
+except ImportError:
+    # Windows: 프로세스 간 잠금이 없으므로 한 프로세스에서만 저장해야 함
+    fcntl = None
+
+# 여러 프로세스가 같은 저장소에 동시에 써도 되는지 (regular.run이 뉴스 단계를 process로 실행할지 정함)
+PROCESS_SAFE = fcntl is not None
+
+# 수집한 기사 본문(문장 리스트)을 압축해 로컬에 쌓아 두는 저장소.
+# 모델이나 TextRank 파라미터가 바뀌어도 네이버를 다시 크롤링하지 않고 디스크에서 다시 읽어 처리할 수 있음.
+#   segments/NNNNNNNN.seg : 압축된 레코드를 이어 붙이기만 하는 파일
+#   index.jsonl           : url -> (레코드 해시, 세그먼트, 오프셋, 길이). 역시 이어 붙이기만 함
+#   lock                  : 여러 프로세스(regular.run의 뉴스 worker)가 함께 쓸 때 추가를 한 번에 하나씩 하기 위한 flock 파일
+
+
+class ArticleStore(object):
+    def __init__(self, root, segment_size=64 * 1024 * 1024):
+        """
+        :param root: directory of the store
+        :param segment_size: a new segment file is started after this many bytes
+        """
+        self.root = root
+        self.segment_dir = os.path.join(root, 'segments')
+        self.index_path = os.path.join(root, 'index.jsonl')
+        self.lock_path = os.path.join(root, 'lock')
+        self.index_pos = 0
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        self.urls = {}
+        self.hashes = {}
+        self.segment = 1
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        # 마지막으로 읽은 곳부터 읽으므로, 다시 부르면 다른 프로세스가 그 사이 추가한 줄을 반영함
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'rb') as f:
+            f.seek(self.index_pos)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                self.index_pos += len(line)
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    # 기록 도중 중단되어 잘린 줄은 무시함
+                    continue
+                self.urls[row['url']] = row['hash']
+                self.hashes[row['hash']] = (row['seg'], row['off'], row['len'])
+                self.segment = max(self.segment, row['seg'])
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # 스레드끼리는 self.lock, 프로세스끼리는 lock 파일의 flock으로 막고, 그 사이 추가된 index를 읽어 둠
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    self._load()
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _segment_path(self, seg):
+        return os.path.join(self.segment_dir, '%08d.seg' % seg)
+
+    def __contains__(self, url):
+        return url in self.urls
+
+    def __len__(self):
+        return len(self.urls)
+
+    def put(self, url, title, date, sentences):
+        """
+        store one extracted article. identical records (title, date and body) are written once.
+        :return: record hash
+        """
+        body = json.dumps({'title': title, 'date': date, 'sentences': sentences}, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        # 제목/날짜까지 포함해 해시해야 본문만 같은 다른 기사가 서로의 제목/날짜를 덮어쓰지 않음
+        digest = hashlib.sha1(body).hexdigest()
+        with self._locked():
+            if self.urls.get(url) == digest:
+                return digest
+            if digest not in self.hashes:
+                data = zlib.compress(body)
+                path = self._segment_path(self.segment)
+                if os.path.exists(path) and os.path.getsize(path) + len(data) > self.segment_size:
+                    self.segment += 1
+                    path = self._segment_path(self.segment)
+                with open(path, 'ab') as f:
+                    off = f.tell()
+                    f.write(data)
+                self.hashes[digest] = (self.segment, off, len(data))
+            seg, off, length = self.hashes[digest]
+            line = (json.dumps({'url': url, 'hash': digest, 'seg': seg, 'off': off, 'len': length}) + '\n').encode('utf-8')
+            with open(self.index_path, 'ab') as f:
+                f.write(line)
+            self.index_pos += len(line)
+            self.urls[url] = digest
+        return digest
+
+    def _read(self, f, off, length):
+        f.seek(off)
+        return json.loads(zlib.decompress(f.read(length)).decode('utf-8'))
+
+    def get(self, url):
+        """
+        :return: dict(title, date, sentences) or None
+        """
+        digest = self.urls.get(url)
+        if digest is None:
+            return None
+        seg, off, length = self.hashes[digest]
+        with open(self._segment_path(seg), 'rb') as f:
+            return self._read(f, off, length)
+
+    def iter_articles(self, urls=None):
+        """
+        stream stored articles in on-disk order
+        :param urls: only these urls (default: every url)
+        :return: generator of (url, dict(title, date, sentences))
+        """
+        if urls is None:
+            urls = list(self.urls.keys())
+        located = []
+        for url in urls:
+            digest = self.urls.get(url)
+            if digest is not None:
+                located.append((self.hashes[digest], url))
+        located.sort()
+        f = None
+        current = None
+        try:
+            for (seg, off, length), url in located:
+                if seg != current:
+                    if f is not None:
+                        f.close()
+                    f = open(self._segment_path(seg), 'rb')
+                    current = seg
+                yield url, self._read(f, off, length)
+        finally:
+            if f is not None:
+                f.close()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = ArticleStore(settings.ARTICLE_STORE_ROOT)
+    return _store
@@ -0,0 +1,160 @@
+import time
+import uuid
+import hmac
+import base64
+import hashlib
+import datetime
+import collections
+import requests
+from django.conf import settings
+from django.db.models import Q
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+from NewShop import local_settings
+from Displayer.models import Notification
+
+# Notification에 쌓인 메일/문자를 모아서 보내는 worker.
+# 메일은 SMTP 연결 하나로 여러 통을 보내고, 문자는 SENS 요청 하나에 SMS_BATCH건까지 넣음 (받는 사람마다 내용이 달라도 됨).
+# 실패하면 점점 길게 기다렸다 다시 보내고, MAX_ATTEMPTS번 실패하면 DEAD로 남김.
+# 여러 worker(drain_outbox, regular.run)가 동시에 돌 수 있으므로, 보내기 전에 UPDATE 한 번으로 행을 SENDING으로 가져감(claim).
+# 보내던 worker가 죽으면 LEASE가 지난 뒤 다른 worker가 다시 가져감
+
+MAX_ATTEMPTS = 5
+LEASE = datetime.timedelta(minutes=10)
+SMS_BATCH = 100     # SENS 요청 하나에 넣을 수 있는 최대 메시지 수
+
+
+def sms_request(messages, sens_url=None):
+    """
+    :param messages: list of (phone, content). each message carries its own content
+    """
+    # 이 부분은 저의 전화번호가 넷상에 남게 되는 실수가 있을 수 있기 때문에 로컬 테스트 시에는 outbox_stub을 사용해 주세요.
+    url = sens_url or settings.SENS_URL
+    uri = '/sms/v2/services/'+local_settings.svc_id+'/messages'
+    data = {
+        "type": "SMS",
+        "from": local_settings.hp,
+        "messages": [{"to": phone, "content": content} for phone, content in messages],
+        # 기본 내용은 필수 항목이라 넣어 두지만 메시지마다 있는 content가 쓰임
+        "content": messages[0][1]
+    }
+    access_key = local_settings.access_key
+    secret_key = bytes(local_settings.secret_key, 'UTF-8')
+    stamp = str(int(time.time()*1000))
+    msg = bytes("POST "+uri+"\n"+stamp+"\n"+access_key, 'UTF-8')
+    sv2 = base64.b64encode(hmac.new(secret_key, msg, digestmod=hashlib.sha256).digest())
+    headers = {
+        "Content-Type": "application/json; charset=utf-8",
+        "x-ncp-iam-access-key": access_key,
+        "x-ncp-apigw-signature-v2": sv2,
+        "x-ncp-apigw-timestamp": stamp
+    }
+    res = requests.post(url+uri, json=data, headers=headers, timeout=10)
+    res.raise_for_status()
+
+
+def _mark_sent(rows):
+    for row in rows:
+        row.status = Notification.SENT
+        row.attempts += 1
+    Notification.objects.bulk_update(rows, ['status', 'attempts'])
+
+
+def _mark_failed(rows, error):
+    now = timezone.now()
+    for row in rows:
+        row.attempts += 1
+        row.last_error = str(error)[:400]
+        if row.attempts >= MAX_ATTEMPTS:
+            row.status = Notification.DEAD
+        else:
+            row.status = Notification.PENDING
+            row.next_try = now + datetime.timedelta(minutes=2 ** row.attempts)
+    Notification.objects.bulk_update(rows, ['status', 'attempts', 'last_error', 'next_try'])
+
+
+def send_emails(rows, connection=None):
+    if not rows:
+        return 0
+    connection = connection or get_connection()
+    sent = []
+    failed = []
+    try:
+        connection.open()
+    except Exception as e:
+        _mark_failed(rows, e)
+        return 0
+    try:
+        for row in rows:
+            message = EmailMessage(subject=row.title, body=row.content, to=[row.to], connection=connection)
+            try:
+                connection.send_messages([message])
+                sent.append(row)
+            except Exception as e:
+                failed.append((row, e))
+    finally:
+        connection.close()
+    _mark_sent(sent)
+    for row, e in failed:
+        _mark_failed([row], e)
+    return len(sent)
+
+
+def send_sms(rows, sens_url=None):
+    # 알림 문자는 사용자 이름이 들어가 내용이 모두 다르므로, 내용과 상관없이 개수로 묶음
+    sent = 0
+    for i in range(0, len(rows), SMS_BATCH):
+        chunk = rows[i:i+SMS_BATCH]
+        try:
+            sms_request([(row.to, row.content) for row in chunk], sens_url)
+        except Exception as e:
+            _mark_failed(chunk, e)
+            continue
+        _mark_sent(chunk)
+        sent += len(chunk)
+    return sent
+
+
+def claim(batch_size=200):
+    """
+    take up to batch_size due notifications for this worker
+    :return: claimed rows (status SENDING)
+    """
+    now = timezone.now()
+    due = Notification.objects.filter(Q(status=Notification.PENDING) | Q(status=Notification.SENDING), next_try__lte=now)
+    candidates = list(due.order_by('id').values_list('id', flat=True)[:batch_size])
+    if not candidates:
+        return []
+    token = uuid.uuid4().hex
+    # 조건(PENDING이거나 lease가 끝난 SENDING)을 UPDATE에 다시 걸어서 다른 worker가 먼저 가져간 행은 건너뜀
+    due.filter(id__in=candidates).update(status=Notification.SENDING, claim=token, next_try=now + LEASE)
+    return list(Notification.objects.filter(claim=token, status=Notification.SENDING).order_by('id'))
+
+
+def send(rows, connection=None, sens_url=None):
+    """
+    :param rows: claimed rows
+    :return: number of rows sent
+    """
+    emails = [row for row in rows if row.channel == Notification.EMAIL]
+    sms = [row for row in rows if row.channel == Notification.SMS]
+    return send_emails(emails, connection) + send_sms(sms, sens_url)
+
+
+def drain(batch_size=200, connection=None, sens_url=None):
+    """
+    send every due notification
+    :param connection: email backend connection (default: settings)
+    :param sens_url: SENS base url (default: settings.SENS_URL)
+    :return: dict of sent / failed counts
+    """
+    ret = collections.Counter()
+    while True:
+        rows = claim(batch_size)
+        if not rows:
+            break
+        sent = send(rows, connection, sens_url)
+        ret['sent'] += sent
+        ret['failed'] += len(rows) - sent
+    ret['dead'] = Notification.objects.filter(status=Notification.DEAD).count()
+    return dict(ret)
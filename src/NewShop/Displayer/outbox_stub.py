@@ -0,0 +1,87 @@
+import json
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# outbox 테스트용 로컬 SMTP/SENS 서버. 실제로 메일이나 문자를 보내지 않고 받은 내용을 기록만 함
+
+
+class SmtpStub(object):
+    def __init__(self, host='127.0.0.1', port=0):
+        stub = self
+        self.messages = []
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write((line+'\r\n').encode())
+
+            def handle(self):
+                self.reply('220 stub')
+                rcpt = []
+                while True:
+                    line = self.rfile.readline().decode(errors='replace').strip()
+                    if not line:
+                        return
+                    cmd = line[:4].upper()
+                    if cmd == 'RCPT':
+                        rcpt.append(line.split(':', 1)[1].strip(' <>'))
+                        self.reply('250 ok')
+                    elif cmd == 'DATA':
+                        self.reply('354 end with .')
+                        data = []
+                        while True:
+                            row = self.rfile.readline().decode(errors='replace')
+                            if row in ('.\r\n', '.\n', ''):
+                                break
+                            data.append(row)
+                        stub.messages.append({'to': rcpt, 'data': ''.join(data)})
+                        rcpt = []
+                        self.reply('250 ok')
+                    elif cmd == 'QUIT':
+                        self.reply('221 bye')
+                        return
+                    else:
+                        # EHLO, HELO, MAIL, RSET, NOOP
+                        self.reply('250 ok')
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SensStub(object):
+    def __init__(self, host='127.0.0.1', port=0, status=202):
+        stub = self
+        self.requests = []
+        self.status = status
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.requests.append({'path': self.path, 'body': json.loads(body or b'{}')})
+                self.send_response(stub.status)
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer((host, port), Handler)
+        self.host, self.port = self.server.server_address
+        self.url = 'http://%s:%d' % (self.host, self.port)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,27 +1,85 @@
-from Displayer.news.crawler import crawler
-from Displayer.news.nlp_main import test_model, make_word_cloud
+from django.conf import settings
+from Displayer.news.crawler import crawler, Crawler
+from Displayer.news.scheduler import scheduler
+from Displayer.news.ingest import Ingestor
+from Displayer.news.store import PROCESS_SAFE
+from Displayer.outbox import drain
+from Displayer.news.nlp_main import test_model, make_word_cloud, load_model
 from Displayer.models import Price, SpProduct, NspProduct, Product
+from Displayer.dag import Dag, Stage, Checkpoint
+import atexit
 import datetime
+import threading
 
-# 주기적으로 수행되기 위한 함수. 현재 가격 축적->알림->뉴스 축적->알림
+MODEL_PATH = 'Displayer/news/best_model.pth'
+
+
+def crawl_price(sp, ingestor):
+    if not crawler.update_market_price(sp, ingestor):
+        # 차단 등으로 실패한 상품은 다른 상품을 다 돈 뒤 한 번 더 시도
+        scheduler.defer(crawler.update_market_price, sp, ingestor)
+        return False
+    return True
+
+
+_news_lock = threading.Lock()
+_news_worker = {}
+
+
+def news_worker():
+    # 모델과 Crawler(다운로드 스레드, 파싱 프로세스)는 worker마다 한 번만 만들고 상품마다 다시 씀
+    with _news_lock:
+        if not _news_worker:
+            crawler_ = Crawler()
+            atexit.register(crawler_.close)
+            _news_worker.update(loaded=load_model(MODEL_PATH), crawler=crawler_)
+        return _news_worker
+
+
+def setup_news_worker(workers):
+    # 뉴스 단계의 worker 프로세스마다 scheduler가 따로 있으므로, 도메인별 요청 속도를 실제 worker 수로 나눠 합이 원래 속도가 되게 함
+    scheduler.share(workers)
+    news_worker()
+
+
+def crawl_news(nsp_id):
+    # 별도 프로세스(Windows에서는 스레드)에서 실행됨. 뉴스 저장까지 이 안에서 끝냄
+    nsp = NspProduct.objects.get(id=nsp_id)
+    today = datetime.date.today().isoformat()
+    latest = nsp.getNews().first()
+    if latest is None:
+        test_model([nsp.name], [20200101,today], 500, MODEL_PATH, **news_worker())
+    else:
+        lastdate = (latest.date+datetime.timedelta(days=1)).isoformat()
+        test_model([nsp.name], [lastdate,today], 50, MODEL_PATH, **news_worker())
+    return True
+
+
+# 주기적으로 수행되기 위한 함수.
+# 가격 수집(thread)과 뉴스 수집/분류(process)는 동시에 진행하고, 워드 클라우드는 뉴스가, 알림 발송은 둘 다 끝난 뒤에 함.
+# 알림은 저장 직후 Ingestor가 outbox에 쌓음. 중간에 멈추면 같은 날 다시 실행했을 때 끝난 상품은 건너뜀
 def run():
     today = datetime.date.today().isoformat()
-    all_p=Product.objects.all()
-    all_sp=SpProduct.objects.all()
-    all_nsp=NspProduct.objects.all()
-    for sp in all_sp:
-        crawler.update_market_price(sp.name)
-    for nsp in all_nsp:
-        if nsp.getNews().first() is None:
-            test_model([nsp.name], [20200101,today], 500, 'Displayer/news/best_model.pth')
-            make_word_cloud([nsp.name])
-        else:
-            lastdate = (nsp.getNews().first().date+datetime.timedelta(days=1)).isoformat()
-            if lastdate is None:
-                lastdate='20200601'
-            test_model([nsp.name], [lastdate,today], 50, 'Displayer/news/best_model.pth')
-            make_word_cloud([nsp.name])
-    for p in all_p:
-        p.sendNewsAlarm()
-        p.sendPriceAlarm()
+    # 가격은 모아 두었다가 묶음 단위로 저장
+    ingestor = Ingestor()
+
+    def finish_price():
+        scheduler.run_deferred()
+        ingestor.flush()
 
+    stages = [
+        Stage('price', lambda sp: crawl_price(sp, ingestor),
+              items=lambda: [(sp.id, sp) for sp in SpProduct.objects.all()],
+              workers=settings.REGULAR_WORKERS['price'], commit=ingestor.flush, finish=finish_price),
+        # 기사 저장소는 fcntl이 없으면(Windows) 프로세스 사이에 잠글 수 없으므로 그때는 스레드로 실행
+        Stage('news', crawl_news,
+              items=lambda: [(pk, pk) for pk in NspProduct.objects.values_list('id', flat=True)],
+              kind='process' if PROCESS_SAFE else 'thread', workers=settings.REGULAR_WORKERS['news'], setup=setup_news_worker),
+        Stage('cloud', lambda: make_word_cloud(list(NspProduct.objects.values_list('name', flat=True))), after=['news']),
+        # 쌓인 알림 메일/문자 발송
+        Stage('outbox', lambda: print(drain()), after=['price', 'news']),
+    ]
+    dag = Dag(stages, Checkpoint(settings.REGULAR_CHECKPOINT, today), settings.REGULAR_MAX_WORKERS)
+    dag.run()
+    dag.print_report()
+    scheduler.print_report()
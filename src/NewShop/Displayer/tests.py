@@ -1,3 +1,181 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
+from django.core.mail import get_connection
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from NewShop import local_settings
+from Displayer import outbox
+from Displayer.outbox_stub import SmtpStub, SensStub
+from Displayer.charts import downsample
+from Displayer.models import Product, NspProduct, SpProduct, News, Price, Notification
 
 # Create your tests here.
+
+
+class HotQueryIndexTests(TestCase):
+    # 자주 쓰는 조회 쿼리가 인덱스를 타는지 실행 계획(EXPLAIN)으로 확인함
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.nsp = NspProduct.objects.create(name='ssd')
+        cls.sp = SpProduct.objects.create(name='삼성 ssd', product=cls.nsp)
+        today = datetime.date.today()
+        for i in range(20):
+            date = today - datetime.timedelta(days=i)
+            News.objects.create(product=cls.nsp, date=date, title=f'title {i}', url=f'https://news.example.com/{i}', subj=0, piece='')
+            Price.objects.create(product=cls.sp, date=date, value=10000 + i)
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            # sqlite: 인덱스를 쓰면 "SEARCH ... USING (COVERING) INDEX", 전체 탐색이면 "SCAN"
+            self.assertIn('INDEX', plan, plan)
+            self.assertNotIn('SCAN', plan, plan)
+            # 정렬도 인덱스 순서로 끝나야 함
+            self.assertNotIn('TEMP B-TREE', plan, plan)
+        else:
+            # mysql: type 컬럼이 ALL이면 전체 탐색
+            self.assertNotIn('ALL', plan.split(), plan)
+        if index is not None:
+            self.assertIn(index, plan, plan)
+
+    def test_product_by_name(self):
+        self.assertUsesIndex(Product.objects.filter(name='ssd'))
+
+    def test_news_by_url(self):
+        self.assertUsesIndex(News.objects.filter(url='https://news.example.com/1'))
+
+    def test_news_by_title(self):
+        self.assertUsesIndex(News.objects.filter(title='title 1'))
+
+    def test_news_history(self):
+        self.assertUsesIndex(News.objects.filter(product_id=self.nsp.id).order_by('-date'), 'news_product_date_idx')
+
+    def test_price_history(self):
+        # (product, date) 인덱스는 price_product_date_uniq 제약이 만듦 (sqlite에서는 autoindex 이름으로 보임)
+        self.assertUsesIndex(Price.objects.filter(product_id=self.sp.id).order_by('-date'))
+
+
+# 보내는 주소는 local_settings.mail에서 오므로 비어 있어도 통과하도록 고정함
+@override_settings(DEFAULT_FROM_EMAIL='noreply@example.com')
+@mock.patch.multiple(local_settings, svc_id='svc', hp='01000000000', access_key='key', secret_key='secret', create=True)
+class OutboxTests(TestCase):
+    # 실제로 보내지 않고 outbox_stub의 로컬 SMTP/SENS 서버로 보냄
+
+    def setUp(self):
+        self.smtp = SmtpStub().start()
+        self.sens = SensStub().start()
+        self.connection = get_connection('django.core.mail.backends.smtp.EmailBackend', host=self.smtp.host, port=self.smtp.port,
+                                         username='', password='', use_tls=False)
+
+    def tearDown(self):
+        self.smtp.stop()
+        self.sens.stop()
+
+    def drain(self):
+        return outbox.drain(connection=self.connection, sens_url=self.sens.url)
+
+    def sms(self, content, n):
+        return Notification.objects.bulk_create([Notification(channel=Notification.SMS, to='0101234%04d' % i, content=content)
+                                                 for i in range(n)])
+
+    def test_email_sent(self):
+        Notification.objects.create(channel=Notification.EMAIL, to='a@example.com', title='t', content='c')
+        self.assertEqual(self.drain()['sent'], 1)
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertEqual(self.smtp.messages[0]['to'], ['a@example.com'])
+        self.assertEqual(Notification.objects.get().status, Notification.SENT)
+
+    def test_sms_batched_by_count(self):
+        # 알림 문자처럼 받는 사람마다 내용이 달라도 SMS_BATCH건씩 한 요청으로: 100 + 51
+        Notification.objects.bulk_create([Notification(channel=Notification.SMS, to='0101234%04d' % i, content='user%d 알림' % i)
+                                          for i in range(outbox.SMS_BATCH + 51)])
+        self.assertEqual(self.drain()['sent'], outbox.SMS_BATCH + 51)
+        sizes = sorted(len(r['body']['messages']) for r in self.sens.requests)
+        self.assertEqual(sizes, [51, outbox.SMS_BATCH])
+        messages = [m for r in self.sens.requests for m in r['body']['messages']]
+        self.assertEqual(sorted(m['content'] for m in messages), sorted('user%d 알림' % i for i in range(outbox.SMS_BATCH + 51)))
+        self.assertFalse(Notification.objects.exclude(status=Notification.SENT).exists())
+
+    def test_failure_is_retried_with_backoff(self):
+        self.sens.status = 500
+        self.sms('fail', 1)
+        before = timezone.now()
+        result = self.drain()
+        self.assertEqual(result['failed'], 1)
+        row = Notification.objects.get()
+        self.assertEqual(row.status, Notification.PENDING)
+        self.assertEqual(row.attempts, 1)
+        self.assertTrue(row.last_error)
+        self.assertGreaterEqual(row.next_try, before + datetime.timedelta(minutes=2))
+        # 아직 재시도 시간이 되지 않았으므로 다시 보내지 않음
+        self.assertEqual(self.drain().get('failed', 0), 0)
+        self.assertEqual(len(self.sens.requests), 1)
+
+        row.next_try = timezone.now()
+        row.save()
+        self.drain()
+        row.refresh_from_db()
+        self.assertEqual(row.attempts, 2)
+        self.assertGreaterEqual(row.next_try, timezone.now() + datetime.timedelta(minutes=3))
+
+    def test_dead_after_max_attempts(self):
+        self.sens.status = 500
+        self.sms('fail', 1)
+        Notification.objects.update(attempts=outbox.MAX_ATTEMPTS - 1)
+        self.assertEqual(self.drain()['dead'], 1)
+        self.assertEqual(Notification.objects.get().status, Notification.DEAD)
+
+    def test_claimed_rows_are_not_claimed_again(self):
+        self.sms('once', 3)
+        first = outbox.claim()
+        self.assertEqual(len(first), 3)
+        self.assertEqual(outbox.claim(), [])
+        # lease가 끝나면 (보내던 worker가 죽은 경우) 다시 가져갈 수 있음
+        Notification.objects.update(next_try=timezone.now())
+        self.assertEqual(len(outbox.claim()), 3)
+
+
+class ApiParamTests(TestCase):
+    # 잘못된 요청 값은 500/404가 아니라 400
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.nsp = NspProduct.objects.create(name='ssd')
+
+    def test_bad_limit(self):
+        url = reverse('api_json_v2', kwargs={'keyword': 'ssd'})
+        for limit in ('abc', '0', '-5'):
+            self.assertEqual(self.client.get(url, {'limit': limit}).status_code, 400, limit)
+        self.assertEqual(self.client.get(url, {'limit': '1'}).status_code, 200)
+
+    def test_conditional_get(self):
+        sp = SpProduct.objects.create(name='삼성 ssd', product=self.nsp)
+        Price.objects.create(product=sp, date=datetime.date(2020, 6, 1), value=10000)
+        url = reverse('api_json_v2', kwargs={'keyword': '삼성 ssd'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('10000', b''.join(response.streaming_content).decode())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_bad_date(self):
+        self.assertEqual(self.client.get(reverse('api_json_v2', kwargs={'keyword': 'ssd'}), {'from': '2020-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_prices'), {'name': 'ssd', 'to': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_prices'), {'id': 'x'}).status_code, 400)
+
+
+class DownsampleTests(SimpleTestCase):
+
+    def test_at_most_target_points(self):
+        values = [i % 7 for i in range(1000)]
+        for target in (4, 5, 10, 11, 500):
+            keep = downsample(values, target)
+            self.assertLessEqual(len(keep), target, target)
+            self.assertEqual((keep[0], keep[-1]), (0, 999))
+
+    def test_small_target_rejected(self):
+        with self.assertRaises(ValueError):
+            downsample(list(range(10)), 3)
@@ -3,6 +3,8 @@ from django.contrib.auth import views as auth_views
 from django.conf.urls import static
 from NewShop import settings
 from . import views
+from . import api
+from . import async_views
 
 
 urlpatterns = [ 
@@ -10,9 +12,12 @@ urlpatterns = [
     path('home', views.home, name='home'),     # 예를 들어 기본 주소/home은 views.home을 부르는 url이 됨. Displayer/views.py로 이동
     path('product',views.q2key,name='q2key'),
     path('product/<str:keyword>',views.search,name='search'),
+    path('async/product/<str:keyword>', async_views.search_async, name='search_async'),
     path('API/<str:keyword>',views.api_search,name='api_get'),
     path('API_xlsx/<str:keyword>', views.api_xlsx, name='api_xlsx'),
     path('API_json/<str:keyword>', views.api_json, name='api_json'),
+    path('API/v2/json/<str:keyword>', api.api_json_v2, name='api_json_v2'),
+    path('API/v2/prices', api.api_prices, name='api_prices'),
     path('mypage', views.myPage, name='mypage'),
     path('change_pw', views.change_pw, name='change_pw'),
     path('hpchange',views.hpChange,name='hp_change'),
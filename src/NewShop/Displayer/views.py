@@ -1,6 +1,9 @@
 from django.shortcuts import render, redirect, HttpResponse
 from .models import *
 from .forms import ReportForm
+from .feed import feed_page
+from .charts import price_chart
+from .caching import bump, bookmarks_key, product_version
 from Displayer.news.nlp_main import get_recommend_query
 from django.contrib.auth.decorators import login_required
 from .news.crawler import crawler
@@ -8,13 +11,23 @@ from django.contrib import messages
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.hashers import check_password
 from django.core import serializers
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
+from django.core.cache import cache
 import random
 import datetime
 import urllib.parse
+import csv
 
 news_category=['가격', '신제품', '프로모션', '동향']
 
+# 요청 하나 안에서 같은 상품은 한 번만 조회함(identity map). 하위 클래스도 같은 쿼리로 가져옴
+def get_product(request, keyword):
+    if not hasattr(request, 'products'):
+        request.products = {}
+    if keyword not in request.products:
+        request.products[keyword] = Product.objects.resolved().get(name=keyword)
+    return request.products[keyword]
+
 # Create your views here.
 def redir(request):
     return redirect('home',)
@@ -30,17 +43,14 @@ def home(request):
     bookmarks=None
     prod = None
     newz=None
+    next_cursor=None
     if logged:
-        bookmarks=usr.handle.favor.all()
+        bookmarks=usr.handle.favor.select_related('product')
         hist = usr.handle.history.order_by('-pk')
         if hist.count()>0:
             prod=hist[0].product
-        newz=News.objects.none()
-        for mark in bookmarks:
-            newz |= mark.product.getNews()
-        if newz.count()>0:
-            newz.order_by('-date')
-    return render(request, 'Displayer/home.html',{'logged':logged, 'bookmarks':bookmarks, 'news':newz, 'user':usr, 'history':hist,'product':prod,'theme':news_category})
+        newz, next_cursor = feed_page(usr.handle, request.GET.get('cursor'))
+    return render(request, 'Displayer/home.html',{'logged':logged, 'bookmarks':bookmarks, 'news':newz, 'next_cursor':next_cursor, 'user':usr, 'history':hist,'product':prod,'theme':news_category})
     # request는 GET/POST 메소드의 모든 정보를 담고 있음. render를 통해 html파일과 연결.
 
 def q2key(request):
@@ -52,28 +62,59 @@ def q2key(request):
     else:
         return HttpResponse('Not Found')
 
-def search(request, keyword):
+MARKET_TTL = 60 * 10     # 실시간 가격표는 새 가격이 없어도 10분이 지나면 다시 가져옴
+PAGE_TTL = 60 * 60 * 24
+
+
+def page_version(prod):
+    # 상품 페이지 캐시 버전. 가격/뉴스/워드 클라우드가 저장될 때마다 바뀜
+    concrete = prod.resolve()
+    if concrete is None:
+        return '0'
+    return product_version(concrete)
+
+def market_key(prod, version):
+    return 'market:%d:%s' % (prod.id, version)
+
+def fetch_market(keyword):
+    """
+    crawl the real time market prices. uses neither the database nor the cache
+    :return: (market_list, average, low)
+    """
+    market_list = crawler.get_market_real_time(keyword, interactive=True)
+    prices = [market['price'] for market in market_list]
+    avg = sum(prices)/len(prices) if prices else 0
+    low = min(prices) if prices else 99999999999
+    return (market_list, avg, low)
+
+def market_table(keyword, prod, version):
+    """
+    :return: (market_list, average, low) of the real time market prices
+    """
+    key = market_key(prod, version)
+    ret = cache.get(key)
+    if ret is None:
+        ret = fetch_market(keyword)
+        cache.set(key, ret, MARKET_TTL)
+    return ret
+
+def cloud_url(prod, version):
+    key = 'cloud:%d:%s' % (prod.id, version)
+    url = cache.get(key)
+    if url is None:
+        cl = prod.getInfluence()
+        url = cl.img.url if cl else ''
+        cache.set(key, url, PAGE_TTL)
+    return url
+
+def user_state(request, prod):
+    """
+    the per-user part of a product page (never cached). records the visit in History.
+    :return: (logged, booked, alarmed)
+    """
     logged=request.user.is_authenticated
-    market_list=[]
-    market_list = crawler.get_market_real_time(keyword)    
-    prod=Product.objects.get(name=keyword)
-    price=prod.getPrice()
-    pr_dates=[]
-    pr_values=[]
-    avg=0
-    count=0
-    low=99999999999
-    nnewz=prod.getNews()
     booked=False
     alarmed = False
-    ap=request.build_absolute_uri('/').strip("/")
-    cl = prod.getInfluence()    
-
-    if cl is not None:
-        cloud_path = ap+prod.getInfluence().img.url
-    else:
-        cloud_path = None
-        
     if logged:
         History.objects.filter(user=request.user.handle,product=prod).delete()
         History(user=request.user.handle, product=prod).save()
@@ -81,72 +122,78 @@ def search(request, keyword):
             booked=True
         if Alarm.objects.filter(user=request.user.handle, product=prod).count()>0:
             alarmed=True
- 
-    for dv in price.values('date','value'):
-        pr_dates.append(str(dv['date']))
-        pr_values.append(dv['value'])
-    for market in market_list:
-        avg+=market['price']
-        if low>market['price']:
-            low=market['price']            
-        count+=1
-    if avg!=0:
-        avg/=count
-
-    scan_start=0
-    news_hover = []
-    for pr_date in pr_dates:
-        pr_date = datetime.datetime.strptime(pr_date, '%Y-%m-%d')
-        newslen = len(nnewz)
-        i=scan_start
-        while i < newslen:
-            news_date = datetime.datetime.strptime(nnewz[i].date, '%Y-%m-%d')
-            if(pr_date < news_date):
-                break
-            i+=1
-        if i>=1 and i <= newslen:
-            news_hover.append(nnewz[i-1].title+", ("+nnewz[i-1].date+")")
-        else:
-            news_hover.append("Not found")
-        scan_start = i
+    return logged, booked, alarmed
+
+def product_context(request, prod, version):
+    # 실시간 가격표를 뺀 상품 페이지 context. DB만 사용함
+    chart=price_chart(prod)
+    nnewz=prod.getNews()
+    # 캐시된 조각(product_sections)에 들어가므로 요청 host를 붙이지 않은 경로만 사용
+    cloud_path = cloud_url(prod, version) or None
+    logged, booked, alarmed = user_state(request, prod)
+    return {'logged':logged, 'pr_dt':chart['pr_dt'],'pr_vl':chart['pr_vl'], 'booked':booked, 'news':nnewz,'news_hover':chart['news_hover'], 'product':prod,'alarmed':alarmed,'theme':news_category, 'cloud':cloud_path, 'version':version, 'page_ttl':PAGE_TTL, 'market_ttl':MARKET_TTL}
+
+def search(request, keyword):
+    prod=get_product(request, keyword)
+    # 가격표, 그래프, 뉴스 목록, 워드 클라우드는 상품 버전으로 캐시하고 (템플릿에서도 같은 버전으로 fragment 캐시)
+    # 즐겨찾기/알림/기록처럼 사용자마다 다른 부분만 매번 계산함
+    version=page_version(prod)
+    market_list, avg, low = market_table(keyword, prod, version)
+    context=product_context(request, prod, version)
+    context.update({'market_list':market_list, 'average':avg, 'low':low})
+
     # 검색어 입력/즐겨찾기 등.. 알림 설정은 팝업을 생각 중
-    return render(request, 'Displayer/product.html',{'logged':logged, 'market_list':market_list, 'pr_dt':pr_dates,'pr_vl':pr_values, 'booked':booked, 'news':nnewz,'news_hover':news_hover, 'product':prod,'average':avg, 'low':low,'alarmed':alarmed,'theme':news_category, 'cloud':cloud_path})
+    return render(request, 'Displayer/product.html', context)
     # 현재의 html을 사용할 것
 
 def api_search(request, keyword):
     logged=request.user.is_authenticated
-    prod=Product.objects.get(name=keyword)
-    pr_dates=[]
-    pr_values=[]
-    price=prod.getPrice()
+    prod=get_product(request, keyword)
+    chart=price_chart(prod)
     ap=request.build_absolute_uri('/').strip("/")
-    for dv in price.values('date','value'):
-        pr_dates.append(str(dv['date']))
-        pr_values.append(dv['value'])
-    return render(request, 'Displayer/api.html',{'logged':logged,'product':prod, 'price':price, 'pr_dt':pr_dates, 'pr_vl':pr_values, 'apiurl':ap})
+    return render(request, 'Displayer/api.html',{'logged':logged,'product':prod, 'pr_dt':chart['pr_dt'], 'pr_vl':chart['pr_vl'], 'apiurl':ap, 'version':page_version(prod), 'page_ttl':PAGE_TTL})
     # 현재의 html을 사용할 것
 
 @login_required
 def toggleBook(request, keyword):
-    prod=Product.objects.get(name=keyword)
+    prod=get_product(request, keyword)
     if Favor.objects.filter(user=request.user.handle,product=prod).count()>0:
         Favor.objects.get(user=request.user.handle,product=prod).delete()
     else:
         Favor(user=request.user.handle,product=prod).save()
+    bump(bookmarks_key(request.user.handle.id))
     return redirect('search',keyword=keyword)
 
+class Echo(object):
+    # csv.writer가 쓴 한 줄을 그대로 돌려주는 버퍼(스트리밍용)
+    def write(self, value):
+        return value
+
+def price_csv(concrete):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['일자', '가격'])
+    for date, value in concrete.getPrice().values_list('date', 'value').iterator():
+        yield writer.writerow([date, value])
+
 def api_xlsx(request, keyword):
-    filename = keyword
-    Product.objects.get(name=keyword).getPriceByTable()
+    filename = urllib.parse.unquote(keyword)
     try:
-        filename = urllib.parse.unquote(filename)
-        file_url = SpProduct.objects.filter(name=filename)[0].getPriceByTable()
-        if os.path.exists(file_url):
-            with open(file_url, 'rb') as fh:
-                response = HttpResponse(fh.read(), content_type='application/vnd.ms-excel')
-                return response
-    except:
+        prod = get_product(request, filename)
+    except Product.DoesNotExist:
+        raise Http404
+    concrete = prod.resolve()
+    if concrete is None:
         raise Http404
+    if request.GET.get('format') == 'csv':
+        return StreamingHttpResponse(price_csv(concrete), content_type='text/csv; charset=utf-8')
+    # (상품, 최신 가격 날짜)가 같으면 만들어 둔 파일 내용을 그대로 사용
+    latest = concrete.getPrice().values_list('date', flat=True).first()
+    key = 'xlsx:%d:%s:%s' % (concrete.id, latest, product_version(concrete))
+    data = cache.get(key)
+    if data is None:
+        data = prod.getPriceByTable()
+        cache.set(key, data, 60 * 60 * 24)
+    return HttpResponse(data, content_type='application/vnd.ms-excel')
 
 def api_json(request, keyword):
     filename = keyword
@@ -161,20 +208,21 @@ def api_json(request, keyword):
 
 @login_required
 def delBook(request, keyword, next):
-    prod=Product.objects.get(name=keyword)
+    prod=get_product(request, keyword)
     Favor.objects.get(user=request.user.handle,product=prod).delete()
+    bump(bookmarks_key(request.user.handle.id))
     return redirect(next)
 
 @login_required
 def delHist(request, keyword):
-    prod=Product.objects.get(name=keyword)
+    prod=get_product(request, keyword)
     History.objects.get(user=request.user.handle,product=prod).delete()
     return redirect('home')
 
 @login_required
 def alarm_set(request, keyword):
     logged=request.user.is_authenticated
-    product = Product.objects.get(name=keyword)
+    product = get_product(request, keyword)
     yours=None
     if Alarm.objects.filter(user=request.user.handle,product=product).count()>0:
         yours=Alarm.objects.get(user=request.user.handle,product=product)
@@ -199,7 +247,7 @@ def alarm_set(request, keyword):
 @login_required
 def alarmDelete(request, keyword):
     logged=request.user.is_authenticated
-    prod=Product.objects.get(name=keyword)
+    prod=get_product(request, keyword)
     if Alarm.objects.filter(user=request.user.handle,product=prod).count()>0:
         Alarm.objects.filter(user=request.user.handle,product=prod).delete()
     return HttpResponse('<script type="text/javascript">window.close();window.opener.location.reload();</script>')
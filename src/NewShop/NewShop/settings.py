@@ -18,6 +18,9 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# 수집한 기사 본문을 압축해 보관하는 곳 (Displayer/news/store.py)
+ARTICLE_STORE_ROOT = os.path.join(BASE_DIR, 'articles')
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 STATIC_URL = '/static/'
@@ -157,3 +160,35 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 # 사이트와 관련한 자동응답을 받을 이메일 주소,'webmaster@localhost'
 
 LOGIN_URL = 'login/'
+
+# 문자 발송(NAVER Cloud SENS) 주소. 테스트 시 Displayer/outbox_stub.py의 로컬 서버 주소로 바꿀 수 있음
+SENS_URL = 'https://sens.apigw.ntruss.com'
+
+# 상품 페이지 가격 그래프에 보낼 최대 점 개수. 이보다 긴 가격 기록은 구간별 최저/최고가만 남겨 줄임 (전체 데이터는 API로 제공)
+CHART_POINTS = 500
+
+# regular.run 설정. 모든 단계를 합쳐 동시에 실행할 최대 작업 수, 단계별 worker 수, 이어서 하기 위한 체크포인트 파일
+REGULAR_MAX_WORKERS = 8
+REGULAR_WORKERS = {'price': 6, 'news': 2}
+REGULAR_CHECKPOINT = os.path.join(BASE_DIR, 'regular_checkpoint.jsonl')
+
+# 캐시. 웹 서버와 크롤러/regular.run worker 프로세스가 같은 캐시를 봐야 저장 시 bump()한 버전이 웹 서버에 전달되므로
+# 프로세스마다 따로인 기본 LocMemCache 대신 DB 캐시를 사용함. 처음 한 번 python manage.py createcachetable 을 실행해야 함.
+# Redis/Memcached가 있으면 BACKEND/LOCATION만 바꾸면 됨.
+# 캐시 무효화용 버전 키(Displayer/caching.py)는 데이터와 다른 테이블에 두고 정리(cull)되지 않게 함.
+# 버전 키가 지워지면 예전 버전으로 저장된 값이 다시 읽힐 수 있기 때문
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'newshop_cache',
+        # 상품별 그래프/페이지 조각/피드가 들어가므로 기본값(300)보다 크게 둠
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'newshop_cache_versions',
+        'TIMEOUT': None,
+        # 상품/사용자 수만큼만 생기는 작은 키라 정리하지 않음
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+    },
+}